@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from make_corpus import MANIFEST_FILE
+
+QUERY_FIELDS = re.compile(r'\b(artist|track|album):')
+
+
+def search_key(text):
+    # only letters and digits are compared, so the slug and the advanced query syntax both find the track
+    return ''.join(character for character in QUERY_FIELDS.sub('', text.lower()) if character.isalnum())
+
+
+class DeezerStub:
+    # local stand-in for api.deezer.com and its cover CDN, answering from a corpus manifest or a recording
+    def __init__(self, manifest, latency=0.0, error_rate=0.0, quota=None, quota_period=5.0, cover_bytes=200000,
+                 recording=None, seed=0):
+        self.latency = latency  # seconds added to every response
+        self.error_rate = error_rate  # share of API responses answered with a 503
+        self.quota = quota  # API requests allowed every quota_period seconds, None for no limit
+        self.quota_period = quota_period
+        self.cover = b'\xff\xd8\xff\xe0' + bytes(max(0, cover_bytes - 6)) + b'\xff\xd9'
+        self.recording = recording or {}  # request path (with the query) -> recorded response
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent_requests = collections.deque()
+        self.stats = collections.Counter()
+        self.server = None
+        self.tracks = {}
+        self.albums = collections.defaultdict(list)
+        self.search_index = collections.defaultdict(list)  # a song can have several versions (single, album, ...)
+        self.album_index = {}
+        self.artists = {}  # search key -> (artist id, name)
+        self.artist_albums = collections.defaultdict(list)
+        for entry in manifest:
+            self.tracks[entry['track_id']] = entry
+            self.albums[entry['album_id']].append(entry)
+            self.search_index[search_key(entry['artist'] + entry['title'])].append(entry)
+            self.album_index[search_key(entry['artist'] + entry['album'])] = entry['album_id']
+            artist_id, _ = self.artists.setdefault(search_key(entry['artist']),
+                                                   (len(self.artists) + 1, entry['artist']))
+            if entry['album_id'] not in self.artist_albums[artist_id]:
+                self.artist_albums[artist_id].append(entry['album_id'])
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self, port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def do_GET(self):
+                status, body, content_type = stub.respond(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path):
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(path)
+        endpoint = parsed.path.strip('/').split('/')[0]
+        with self.lock:
+            self.stats[endpoint] += 1
+        if endpoint == 'cover':  # the CDN isn't rate limited and never fails
+            with self.lock:
+                self.stats['cover_bytes'] += len(self.cover)
+            return 200, self.cover, 'image/jpeg'
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 503, b'{}', 'application/json'
+        if self.quota_exceeded():
+            return 200, json.dumps({'error': {'type': 'Exception', 'message': 'Quota limit exceeded',
+                                              'code': 4}}).encode(), 'application/json'
+        if path in self.recording:
+            return 200, json.dumps(self.recording[path]).encode(), 'application/json'
+        data = self.synthetic_response(endpoint, parsed)
+
+        return 200, json.dumps(data).encode(), 'application/json'
+
+    def quota_exceeded(self):
+        if not self.quota:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent_requests and now - self.recent_requests[0] > self.quota_period:
+                self.recent_requests.popleft()
+            if len(self.recent_requests) >= self.quota:
+                self.stats['quota_errors'] += 1
+                return True
+            self.recent_requests.append(now)
+
+        return False
+
+    def synthetic_response(self, endpoint, parsed):
+        segments = parsed.path.strip('/').split('/')
+        identifier = segments[-1]
+        query = parse_qs(parsed.query)
+        if endpoint == 'search' and identifier == 'artist':
+            artist = self.artists.get(search_key(query.get('q', [''])[0]))
+            return {'data': [{'id': artist[0], 'name': artist[1]}] if artist else [], 'total': 1 if artist else 0}
+        if endpoint == 'artist' and identifier == 'albums' and segments[1].isdigit():
+            # paged like the real API, 'next' is left out on the last page
+            album_ids = self.artist_albums.get(int(segments[1]), [])
+            index, limit = int(query.get('index', ['0'])[0]), int(query.get('limit', ['25'])[0])
+            page = {'data': [self.album_result(album_id) for album_id in album_ids[index:index + limit]],
+                    'total': len(album_ids)}
+            if index + limit < len(album_ids):
+                page['next'] = f"{self.url}{parsed.path}?limit={limit}&index={index + limit}"
+            return page
+        if endpoint == 'search' and identifier == 'album':
+            query = parse_qs(parsed.query).get('q', [''])[0]
+            album_id = self.album_index.get(search_key(query))
+            return {'data': [self.album_result(album_id)] if album_id else [], 'total': 1 if album_id else 0}
+        if endpoint == 'search':
+            query = parse_qs(parsed.query).get('q', [''])[0]
+            entries = self.search_index.get(search_key(query), [])
+            return {'data': [self.search_result(entry) for entry in entries], 'total': len(entries)}
+        if endpoint == 'track' and identifier.isdigit() and int(identifier) in self.tracks:
+            entry = self.tracks[int(identifier)]
+            return {'id': entry['track_id'], 'title': entry['title'], 'bpm': 120,
+                    'contributors': [{'id': 1, 'name': entry['artist']}]}
+        if endpoint == 'album' and identifier.isdigit() and int(identifier) in self.albums:
+            entries = self.albums[int(identifier)]
+            return {'id': int(identifier), 'title': entries[0]['album'], 'release_date': f"{entries[0]['year']}-01-01",
+                    'contributors': [{'id': 1, 'name': entries[0]['artist']}],
+                    'genres': {'data': [{'id': 116, 'name': 'Rap/Hip Hop'}]},
+                    'cover_medium': f"{self.url}/cover/{identifier}/250.jpg",
+                    'cover_big': f"{self.url}/cover/{identifier}/500.jpg",
+                    'cover_xl': f"{self.url}/cover/{identifier}/1000.jpg",
+                    'tracks': {'data': [{'id': entry['track_id'], 'title': entry['title'],
+                                         'artist': {'name': entry['artist']}} for entry in entries]}}
+
+        return {'error': {'type': 'DataException', 'message': 'no data', 'code': 800}}
+
+    def album_result(self, album_id):
+        entry = self.albums[album_id][0]
+        return {'id': album_id, 'title': entry['album'], 'nb_tracks': len(self.albums[album_id]),
+                'artist': {'name': entry['artist']}}
+
+    def search_result(self, entry):
+        cover = f"{self.url}/cover/{entry['album_id']}"
+        return {'id': entry['track_id'], 'title': entry['title'], 'artist': {'name': entry['artist']},
+                'album': {'id': entry['album_id'], 'title': entry['album'], 'cover_medium': cover + '/250.jpg',
+                          'cover_big': cover + '/500.jpg', 'cover_xl': cover + '/1000.jpg'}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Deezer API.')
+    parser.add_argument('corpus', help='directory made by make_corpus.py')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--quota', type=int, default=None, help='API requests allowed per --quota-period')
+    parser.add_argument('--quota-period', type=float, default=5.0)
+    parser.add_argument('--recording', help='JSON file mapping request paths to recorded responses')
+    args = parser.parse_args()
+    with open(os.path.join(args.corpus, MANIFEST_FILE)) as file:
+        manifest = json.load(file)
+    recording = None
+    if args.recording:
+        with open(args.recording) as file:
+            recording = json.load(file)
+    stub = DeezerStub(manifest, args.latency, args.error_rate, args.quota, args.quota_period, recording=recording)
+    print(f"Deezer stub listening on {stub.start(args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
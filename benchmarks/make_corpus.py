@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+
+from mutagen.id3 import ID3, TALB, TDRC, TIT2, TPE1, TPE2
+
+FRAME = b'\xff\xfb\x90\x00' + bytes(413)  # one silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz)
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 4
+MANIFEST_FILE = 'manifest.json'
+
+
+def corpus_entries(count):
+    # deterministic artists, albums and tracks, so the stub server and the files always agree
+    for n in range(count):
+        album = n // TRACKS_PER_ALBUM
+        artist = album // ALBUMS_PER_ARTIST
+        yield {'track_id': 100000 + n, 'album_id': 5000 + album, 'artist': f'Artist {artist:04d}',
+               'title': f'Track {n:05d}', 'album': f'Album {album:04d}', 'track_number': n % TRACKS_PER_ALBUM + 1,
+               'year': str(1990 + album % 30)}
+
+
+def make_corpus(directory, count, frames=40):
+    # writes count tagged "Artist - Title.mp3" files and the manifest the stub server answers from
+    os.makedirs(directory, exist_ok=True)
+    manifest = list(corpus_entries(count))
+    for entry in manifest:
+        path = os.path.join(directory, f"{entry['artist']} - {entry['title']}.mp3")
+        with open(path, 'wb') as file:
+            # the track id in the first frame's padding makes every song's audio its own, like a real library's
+            file.write(FRAME[:4] + entry['track_id'].to_bytes(4, 'big') + FRAME[8:] + FRAME * (frames - 1))
+        tags = ID3()
+        tags.add(TPE1(encoding=3, text=entry['artist']))
+        tags.add(TIT2(encoding=3, text=entry['title']))
+        tags.add(TALB(encoding=3, text=entry['album']))
+        tags.add(TPE2(encoding=3, text=entry['artist']))
+        tags.add(TDRC(encoding=3, text=entry['year']))
+        tags.save(path, v2_version=3)
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file)
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic tagged MP3s for the benchmarks.')
+    parser.add_argument('directory')
+    parser.add_argument('--files', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=40, help='MPEG frames per file (417 bytes each)')
+    args = parser.parse_args()
+    make_corpus(args.directory, args.files, args.frames)
+    print(f"{args.files} files written to {args.directory}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import argparse
+import collections
+import socketserver
+import threading
+import time
+
+
+class RedisStub:
+    # local stand-in for a Redis server, with only the commands the work queue uses, so the distributed mode can be
+    # tried without installing one
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expiry = {}  # key -> when it expires, checked when the key is read
+        self.versions = collections.Counter()  # key -> writes so far, for WATCH
+        self.server = None
+        self.url = None
+
+    def start(self, port=0):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                watched = {}  # key -> its version when it was watched, the transaction fails if it changed since
+                queued = None  # the commands after MULTI, run together by EXEC
+                while True:
+                    arguments = read_command(self.rfile)
+                    if arguments is None:
+                        return
+                    command = arguments[0].upper()
+                    if command == 'MULTI':
+                        queued, reply = [], Status('OK')
+                    elif command == 'EXEC':
+                        reply = stub.transaction(watched, queued or [])
+                        watched, queued = {}, None
+                    elif command == 'DISCARD':
+                        watched, queued, reply = {}, None, Status('OK')
+                    elif queued is not None:
+                        queued.append(arguments)
+                        reply = Status('QUEUED')
+                    elif command == 'WATCH':
+                        with stub.lock:
+                            watched.update((key, stub.versions[key]) for key in arguments[1:])
+                        reply = Status('OK')
+                    elif command == 'UNWATCH':
+                        watched, reply = {}, Status('OK')
+                    else:
+                        reply = stub.run(arguments)
+                    self.wfile.write(encode(reply))
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'redis://127.0.0.1:{self.server.server_address[1]}/0'
+
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def value(self, key, kind=None):
+        if key in self.expiry and self.expiry[key] <= time.time():
+            del self.expiry[key]
+            self.data.pop(key, None)
+        if kind is not None and key not in self.data:
+            self.data[key] = kind()
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.expiry.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+    def run(self, arguments):
+        try:
+            return self.execute(arguments)
+        except Exception as err:
+            return RedisStubError(f'ERR {err}')
+
+    def transaction(self, watched, commands):
+        # every command or none, like EXEC
+        with self.lock:
+            if any(self.versions[key] != version for key, version in watched.items()):
+                return NULL_ARRAY
+            return [self.run(arguments) for arguments in commands]
+
+    def execute(self, arguments):
+        command, arguments = arguments[0].upper(), arguments[1:]
+        with self.lock:
+            if command in WRITE_COMMANDS:
+                self.versions.update(arguments if command == 'DEL' else arguments[:1])
+            if command == 'PING':
+                return Status('PONG')
+            if command == 'SELECT':
+                return Status('OK')
+            if command == 'GET':
+                return self.value(arguments[0])
+            if command == 'SET':
+                key, value = arguments[0], arguments[1]
+                self.delete(key)
+                self.data[key] = value
+                options = [argument.upper() for argument in arguments[2:]]
+                if 'PX' in options:
+                    self.expiry[key] = time.time() + int(arguments[2 + options.index('PX') + 1]) / 1000
+                elif 'EX' in options:
+                    self.expiry[key] = time.time() + int(arguments[2 + options.index('EX') + 1])
+                return Status('OK')
+            if command == 'INCR':
+                value = int(self.value(arguments[0]) or 0) + 1
+                self.data[arguments[0]] = str(value)
+                return value
+            if command == 'EXPIRE':
+                if self.value(arguments[0]) is None:
+                    return 0
+                self.expiry[arguments[0]] = time.time() + int(arguments[1])
+                return 1
+            if command == 'DEL':
+                return sum(self.delete(key) for key in arguments if self.value(key) is not None)
+            if command == 'RPUSH':
+                values = self.value(arguments[0], list)
+                values.extend(arguments[1:])
+                return len(values)
+            if command == 'LPOP':
+                values = self.value(arguments[0])
+                if not values:
+                    return None
+                value = values.pop(0)
+                if not values:
+                    self.delete(arguments[0])
+                return value
+            if command == 'LINDEX':
+                values = self.value(arguments[0]) or []
+                index = int(arguments[1])
+                return values[index] if -len(values) <= index < len(values) else None
+            if command == 'LLEN':
+                return len(self.value(arguments[0]) or [])
+            if command == 'SADD':
+                members = self.value(arguments[0], set)
+                added = set(arguments[1:]) - members
+                members.update(added)
+                return len(added)
+            if command == 'SISMEMBER':
+                return int(arguments[1] in (self.value(arguments[0]) or set()))
+            if command == 'ZADD':
+                members = self.value(arguments[0], dict)
+                pairs = list(zip(arguments[1::2], arguments[2::2]))
+                added = sum(member not in members for _, member in pairs)
+                members.update((member, float(score)) for score, member in pairs)
+                return added
+            if command == 'ZREM':
+                members = self.value(arguments[0]) or {}
+                return sum(members.pop(member, None) is not None for member in arguments[1:])
+            if command == 'ZRANGEBYSCORE':
+                members = self.value(arguments[0]) or {}
+                low, high = float(arguments[1]), float(arguments[2])  # float() reads -inf and +inf too
+                return [member for member, score in sorted(members.items(), key=lambda pair: (pair[1], pair[0]))
+                        if low <= score <= high]
+            if command == 'ZCARD':
+                return len(self.value(arguments[0]) or {})
+            if command == 'HSET':
+                fields = self.value(arguments[0], dict)
+                pairs = list(zip(arguments[1::2], arguments[2::2]))
+                added = sum(field not in fields for field, _ in pairs)
+                fields.update(pairs)
+                return added
+            if command == 'HGET':
+                return (self.value(arguments[0]) or {}).get(arguments[1])
+            if command == 'HDEL':
+                fields = self.value(arguments[0]) or {}
+                return sum(fields.pop(field, None) is not None for field in arguments[1:])
+            if command == 'HINCRBY':
+                fields = self.value(arguments[0], dict)
+                value = int(fields.get(arguments[1], 0)) + int(arguments[2])
+                fields[arguments[1]] = str(value)
+                return value
+            if command == 'HLEN':
+                return len(self.value(arguments[0]) or {})
+        return RedisStubError(f"ERR unknown command '{command}'")
+
+
+WRITE_COMMANDS = frozenset({'SET', 'INCR', 'EXPIRE', 'DEL', 'RPUSH', 'LPOP', 'SADD', 'ZADD', 'ZREM', 'HSET', 'HDEL',
+                            'HINCRBY'})
+NULL_ARRAY = object()  # EXEC's answer when a watched key changed
+
+
+class Status(str):
+    pass
+
+
+class RedisStubError(str):
+    pass
+
+
+def read_command(reader):
+    # a command is an array of bulk strings, like the clients send them
+    line = reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):  # an inline command, as typed in telnet
+        return line.decode().split() or read_command(reader)
+    arguments = []
+    for _ in range(int(line[1:-2])):
+        length = int(reader.readline()[1:-2])
+        arguments.append(reader.read(length + 2)[:-2].decode())
+    return arguments
+
+
+def encode(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if reply is NULL_ARRAY:
+        return b'*-1\r\n'
+    if isinstance(reply, RedisStubError):
+        return b'-%s\r\n' % reply.encode()
+    if isinstance(reply, Status):
+        return b'+%s\r\n' % reply.encode()
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(encode(item) for item in reply)
+    data = str(reply).encode()
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for a Redis server, for the work queue.')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    stub = RedisStub()
+    print(f"Redis stub listening on {stub.start(args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+
+from deezer_stub import DeezerStub  # noqa: E402
+from make_corpus import make_corpus  # noqa: E402
+
+SCENARIOS = ('discovery', 'pipeline', 'retag', 'sorter')
+SIZES = (100, 1000, 10000)
+API_ENDPOINTS = ('search', 'track', 'album', 'artist')
+
+
+class NullOutput:
+    # swallows the scraper's prints without a write syscall, so they don't show up in the I/O counters
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def bytes_written():
+    # bytes this process passed to write(), None where /proc isn't available
+    try:
+        with open('/proc/self/io') as io_counters:
+            for line in io_counters:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def run_scenario(scenario, directory, api_url, workers, album_first=False, fetch_bpm=True, tag_writers=0,
+                 catalogue=False, fingerprints=True, update_in_place=False):
+    # runs one scenario in this process and returns its measurements (the stub counts the requests)
+    from tags_scraper import Tagger, core
+
+    core.DEEZER_API_URL = api_url
+    work_directory = os.path.dirname(directory)
+
+    def open_tagger():
+        # no cache or journal, and a request budget that measures the scraper instead of Deezer's quota; the
+        # fingerprint index is on by default, like on the command line
+        return Tagger(directory, automated=True, workers=workers, album_first=album_first, fetch_bpm=fetch_bpm,
+                      tag_writers=tag_writers, cache=False, resume=False, sorting_mode='copy',
+                      requests_per_second=1000000, request_burst=1000000, fingerprints=fingerprints,
+                      update_in_place=update_in_place,
+                      cache_path=os.path.join(work_directory, 'cache', 'responses.sqlite'),
+                      fingerprint_path=os.path.join(work_directory, 'fingerprints.sqlite'),
+                      catalogue_path=os.path.join(work_directory, 'catalogue.sqlite'))
+
+    stdout = sys.stdout
+    sys.stdout = NullOutput()
+    if scenario == 'retag':
+        # the songs are tagged once before the measured run, which finds the same tags (a library tagged before)
+        with open_tagger() as tagger:
+            tagger.tag_all()
+    tagger = open_tagger()
+    written_before = bytes_written()
+    start = time.perf_counter()
+    try:
+        if scenario == 'discovery':
+            files = sum(1 for _ in core.discover_music(tagger, directory, extensions=tagger.extensions))
+        elif scenario in ('pipeline', 'retag'):
+            if catalogue:  # the sync is part of the run, its requests included
+                tagger.prefetch()
+            tagger.tag_all()
+            files = tagger.metrics.snapshot()['counters'].get('files_edited', 0)
+        else:
+            tagger.sort()
+            files = len([name for name in os.listdir(directory) if name.endswith('.mp3')])
+    finally:
+        seconds = time.perf_counter() - start
+        sys.stdout = stdout
+        tagger.close()
+    written_after = bytes_written()
+
+    return {'scenario': scenario, 'files': files, 'seconds': round(seconds, 4),
+            'files_per_second': round(files / seconds, 2) if seconds else None,
+            'bytes_written': written_after - written_before if written_before is not None else None,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'metrics': tagger.metrics.snapshot()}
+
+
+def measure(scenario, template, size, stub, workers, album_first=False, fetch_bpm=True, tag_writers=0,
+            catalogue=False, fingerprints=True, update_in_place=False):
+    # each scenario runs in a fresh process on a fresh copy of the corpus, so peak RSS and the files are its own
+    work_directory = tempfile.mkdtemp(prefix=f'tags-bench-{scenario}-')
+    try:
+        corpus = os.path.join(work_directory, 'corpus')
+        shutil.copytree(template, corpus)
+        requests_before = sum(count for key, count in stub.stats.items() if key in API_ENDPOINTS)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--single', scenario, '--corpus', corpus,
+                                 '--api-url', stub.url, '--workers', str(workers), '--tag-writers', str(tag_writers)]
+                                + (['--album-first'] if album_first else []) + ([] if fetch_bpm else ['--no-bpm'])
+                                + (['--catalogue'] if catalogue else [])
+                                + ([] if fingerprints else ['--no-fingerprints'])
+                                + (['--update-in-place'] if update_in_place else []),
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        requests = sum(count for key, count in stub.stats.items() if key in API_ENDPOINTS)
+        requests -= requests_before
+        result['size'] = size
+        result['api_requests'] = requests
+        result['requests_per_file'] = round(requests / size, 3)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the tags scraper against a local Deezer stand-in.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every stub response')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--quota', type=int, default=None, help='API requests the stub allows per 5 seconds')
+    parser.add_argument('--album-first', action='store_true', help='run the pipeline in the album-first mode')
+    parser.add_argument('--tag-writers', type=int, default=0, help='processes writing the tags (0 writes them inline)')
+    parser.add_argument('--no-bpm', action='store_true', help="don't request the track details for the BPM")
+    parser.add_argument('--catalogue', action='store_true',
+                        help="prefetch the corpus' artists into a local catalogue before the pipeline")
+    parser.add_argument('--no-fingerprints', action='store_true',
+                        help="don't keep the fingerprint index, so the retag searches every song again")
+    parser.add_argument('--update-in-place', action='store_true',
+                        help='update the tags the scraper wrote before where they are instead of copying the songs')
+    parser.add_argument('--frames', type=int, default=40,
+                        help='MPEG frames per synthetic file, 1 keeps big corpora small when only memory is measured')
+    parser.add_argument('--output', help='JSON file for the results (printed when omitted)')
+    parser.add_argument('--single', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_scenario(args.single, args.corpus, args.api_url, args.workers, args.album_first,
+                                      not args.no_bpm, args.tag_writers, args.catalogue, not args.no_fingerprints,
+                                      args.update_in_place)))
+        return
+
+    results = []
+    for size in args.sizes:
+        template = tempfile.mkdtemp(prefix='tags-bench-corpus-')
+        try:
+            manifest = make_corpus(template, size, args.frames)
+            stub = DeezerStub(manifest, args.latency, args.error_rate, args.quota)
+            stub.start()
+            for scenario in args.scenarios:
+                result = measure(scenario, template, size, stub, args.workers, args.album_first, not args.no_bpm,
+                                 args.tag_writers, args.catalogue, not args.no_fingerprints, args.update_in_place)
+                print(f"{scenario} x {size}: {result['files_per_second']} files/s, "
+                      f"{result['requests_per_file']} requests/file, peak RSS {result['peak_rss_kb']} KB",
+                      file=sys.stderr)
+                results.append(result)
+            stub.stop()
+        finally:
+            shutil.rmtree(template, ignore_errors=True)
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'workers': args.workers, 'latency': args.latency,
+              'error_rate': args.error_rate, 'album_first': args.album_first,
+              'fetch_bpm': not args.no_bpm, 'tag_writers': args.tag_writers, 'catalogue': args.catalogue,
+              'fingerprints': not args.no_fingerprints, 'update_in_place': args.update_in_place,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
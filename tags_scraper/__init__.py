@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+# Tags Scraper Remastered as a library: Tagger(directory, **settings) resolves, tags and sorts songs in-process,
+# main() is the command line; the rest of the package is only imported when one of its names is first used
+import importlib
+
+from .cli import main
+
+__all__ = ['Tagger', 'main']
+
+
+def __getattr__(name):
+    core = importlib.import_module('.core', __name__)
+    try:
+        return getattr(core, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import os
+import time
+
+from .defaults import (API_CONNECTIONS, AUDIO_EXTENSIONS, CACHE_MAX_BYTES, CDN_CONNECTIONS, DECISIONS_FILE,
+                       DEEZER_REQUEST_BURST, DEEZER_REQUESTS_PER_SECOND, LEASE_SECONDS, MAX_ATTEMPTS, SORT_MODES,
+                       WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS, default_cache_path)
+
+
+def parse_arguments(arguments=None):
+    # every option can also be kept in a file, one per line, and passed as @file
+    parser = argparse.ArgumentParser(description="Fetches the songs' tags from Deezer, renames and sorts them.",
+                                     fromfile_prefix_chars='@')
+    parser.add_argument('directory', nargs='?', default=os.getcwd(), help='songs directory (the current one)')
+    # the automation tries to avoid singles, but for songs that are just singles, the album selection is a bit poor
+    parser.add_argument('--automated', action='store_true',
+                        help='automates the process and if various artists are detected, it will apply it to the '
+                             'album artist')
+    parser.add_argument('--headless', action='store_true',
+                        help="never asks, the questions are saved to the decisions file and those songs are put off")
+    parser.add_argument('--apply-decisions', action='store_true',
+                        help='headless and cache-only, tags the put off songs with the answers in the decisions file')
+    parser.add_argument('--decisions-file', help=f'where the questions are saved (songs directory/{DECISIONS_FILE})')
+    parser.add_argument('--avoid-singles', action=argparse.BooleanOptionalAction, default=True,
+                        help='if you want the automation to try to avoid singles (some songs are only available as '
+                             'such)')
+    parser.add_argument('--sorting', action=argparse.BooleanOptionalAction, default=True,
+                        help='to sort the songs after tags scraper is finished')
+    parser.add_argument('--sorting-mode', choices=SORT_MODES, default='copy',
+                        help='how songs are put in the Songs folder')
+    parser.add_argument('--recursive', action='store_true', help='also look for songs in the subfolders')
+    parser.add_argument('--extensions', nargs='+', choices=AUDIO_EXTENSIONS, default=['.mp3'],
+                        help='which files are edited')
+    parser.add_argument('--tag-writers', type=int, default=2,
+                        help='processes writing the tags while the workers find the next songs, 0 writes them in '
+                             'the workers')
+    parser.add_argument('--update-in-place', action='store_true',
+                        help="write the new tags of MP3s the scraper tagged before into their existing tags instead of "
+                             "a copy (much less is written, but a crash during the write can leave a tag half-updated)")
+    parser.add_argument('--fetch-bpm', action=argparse.BooleanOptionalAction, default=True,
+                        help="request every track's details for its BPM and featured artists, --no-fetch-bpm saves a "
+                             "request per song but only adds the featured artists of songs named with '&' or feat.")
+    parser.add_argument('--album-first', action='store_true',
+                        help='find whole albums at once (by the album tags or "Artist - Album" folders) before '
+                             'searching')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of songs processed at the same time when automated or headless (1 processes '
+                             'them one by one)')
+    parser.add_argument('--requests-per-second', type=float, default=DEEZER_REQUESTS_PER_SECOND,
+                        help='global request budget shared by all workers')
+    parser.add_argument('--request-burst', type=int, default=DEEZER_REQUEST_BURST,
+                        help='how many requests can be sent back to back before being throttled')
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=True,
+                        help="keeps Deezer's responses on disk so that re-runs on the same songs/albums don't request "
+                             "them")
+    parser.add_argument('--cache-only', action='store_true',
+                        help='offline mode, only uses the responses that are already in the cache')
+    parser.add_argument('--cache-path', default=default_cache_path(), help='where the cache is stored')
+    parser.add_argument('--cache-max-bytes', type=int, default=CACHE_MAX_BYTES,
+                        help='size cap for the cache, and for the cover art kept on disk, the least recently used '
+                             'ones are evicted')
+    parser.add_argument('--api-connections', type=int, default=API_CONNECTIONS,
+                        help="connections kept open to Deezer's API")
+    parser.add_argument('--cdn-connections', type=int, default=CDN_CONNECTIONS,
+                        help='connections kept open to each cover art host')
+    parser.add_argument('--max-cover-size', type=int,
+                        help='downscale the cover art to this many pixels per side (needs Pillow)')
+    parser.add_argument('--jpeg-quality', type=int, default=85, help='JPEG quality for the downscaled cover art')
+    parser.add_argument('--cache-covers', action='store_true',
+                        help='keep the downloaded cover art on disk for the next runs')
+    parser.add_argument('--prefetch', nargs='*', metavar='ARTIST',
+                        help="saves these artists' albums and tracks to the local catalogue (the artists of the songs "
+                             "directory when none are given) and exits, their songs are then tagged without searching")
+    parser.add_argument('--catalogue-path', help='where the local catalogue is stored (next to the cache)')
+    parser.add_argument('--watch', nargs='*', metavar='FOLDER',
+                        help='keeps running and tags the songs dropped in these folders (the songs directory when '
+                             'none are given) as soon as they have been written')
+    parser.add_argument('--settle', type=float, default=WATCH_SETTLE_SECONDS,
+                        help="seconds a dropped song has to stay unchanged before it's tagged")
+    parser.add_argument('--poll-interval', type=float, default=WATCH_POLL_SECONDS,
+                        help="how often the watched folders are listed when inotify isn't available")
+    parser.add_argument('--polling', action='store_true',
+                        help="list the watched folders instead of using inotify (for network shares)")
+    parser.add_argument('--queue', metavar='URL',
+                        help='work queue shared by several workers, redis://host:port/db or a SQLite file for the '
+                             'workers of one machine (alone, it shows how far the queue got)')
+    parser.add_argument('--enqueue', action='store_true', help="adds the songs directory's songs to the --queue")
+    parser.add_argument('--work', action='store_true',
+                        help='tags songs from the --queue until it is empty, sharing the request budget with the '
+                             'other workers')
+    parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS,
+                        help="a worker that doesn't report back in this long loses the song to another worker")
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help='times a queued song is tried before it is marked as failed')
+    parser.add_argument('--fingerprints', action=argparse.BooleanOptionalAction, default=True,
+                        help="remember every song's tags by its audio, so it's never searched again and duplicates "
+                             "are found when sorting")
+    parser.add_argument('--fingerprint-path', help='where the fingerprints are stored (next to the cache)')
+    parser.add_argument('--mmap', action='store_true', help='read the audio for the fingerprints through mmap')
+    parser.add_argument('--duplicates', choices=('report', 'skip'), default='report',
+                        help='what the sorter does with songs whose audio is already in the Songs folder')
+    parser.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING'), default='INFO',
+                        help="'DEBUG' shows the details of every search, 'WARNING' only shows the problems")
+    parser.add_argument('--progress', action='store_true', help='show a live progress line while the songs are edited')
+    parser.add_argument('--metrics-file',
+                        help="write the stage timings and counters here at the end ('.prom' for Prometheus, else "
+                             "JSON)")
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction, default=True,
+                        help='keep a journal in the songs directory, so an interrupted run continues where it stopped')
+
+    options = parser.parse_args(arguments)
+    if (options.enqueue or options.work) and not options.queue:
+        parser.error('--enqueue and --work need a --queue')
+
+    return options
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+
+    # debug details are only formatted and printed when they're asked for
+    logging.basicConfig(level=options.log_level, format='%(message)s')
+
+    # requests, mutagen and the rest are only imported once the options are known to be valid
+    from .core import Tagger
+
+    # time counter
+    start = time.time()
+
+    with Tagger(options=options) as tagger:
+        if options.prefetch is not None:
+            # a one-time sync, the songs are tagged by the next runs
+            tagger.prefetch(options.prefetch)
+        elif options.watch is not None:
+            # runs until it's stopped
+            tagger.watch(options.watch)
+        elif options.queue:
+            # the coordinator fills the queue, the workers (here or on other machines) empty it
+            if options.enqueue:
+                tagger.enqueue(options.queue)
+            elif options.work:
+                tagger.work(options.queue)
+            else:
+                tagger.queue_status(options.queue)
+        else:
+            # the songs are found while the first ones are already being searched for
+            edited_records = tagger.tag_all()
+
+            # sorting the songs after getting the tags, including the ones edited by an interrupted run
+            if options.sorting:
+                tagger.sort(records=edited_records)
+
+    end = time.time()
+    print(f'Total time: {end - start}s')
+
+    if options.metrics_file:
+        tagger.metrics.write(options.metrics_file)
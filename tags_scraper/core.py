@@ -0,0 +1,2825 @@
+# -*- coding: utf-8 -*-
+import requests
+import ctypes
+import ctypes.util
+import hashlib
+import io
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import sys
+import random
+import select
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from requests.adapters import HTTPAdapter
+from mutagen import MutagenError
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import ID3, ID3NoHeaderError, MakeID3v1, APIC, PRIV, TIT2, TPE1, TRCK, TALB, TYER, TCON, TPE2, TPA, \
+    TBPM
+from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4, MP4Cover
+
+try:
+    import fcntl
+except ImportError:  # Windows doesn't have fcntl, songs are copied instead of reflinked there
+    fcntl = None
+
+try:
+    import xxhash
+except ImportError:  # xxhash is optional, the audio fingerprints use blake2b without it
+    xxhash = None
+
+import re
+from urllib.parse import urlencode
+
+from .defaults import (API_CONNECTIONS, AUDIO_EXTENSIONS, CACHE_MAX_BYTES, CDN_CONNECTIONS, DECISIONS_FILE,
+                       DEEZER_REQUEST_BURST, DEEZER_REQUESTS_PER_SECOND, SORT_MODES, WATCH_POLL_SECONDS,
+                       WATCH_SETTLE_SECONDS)
+from .sanitise import WORDS, file_name, fold_accents, sanitise_user_input
+
+
+# ID3 Tags Information:
+# APIC: Cover Art
+# TIT2: Title
+# TPE1: Artist
+# TRCK: Track Number
+# TALB: Album
+# USLT: Lyrics
+# TCON: Genre
+# TBPM: BPM (Beats Per Minute)
+# TPA: Disc Number
+
+log = logging.getLogger('tags_scraper')
+
+# stages timed by the metrics, in the order a song goes through them
+METRICS_STAGES = ('scan', 'sanitise', 'search', 'pick', 'track', 'album', 'cover', 'tag_write', 'sort')
+
+
+class Metrics:
+    # wall time and count for each stage plus run-wide counters, written to a JSON or Prometheus file at the end
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_seconds = defaultdict(float)
+        self.stage_counts = Counter()
+        self.counters = Counter()  # bytes downloaded, cache hits, HTTP retries...
+        self.started = time.monotonic()
+        self.last_progress = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        # for stages timed somewhere else, like the tag writer processes
+        with self.lock:
+            self.stage_seconds[name] += seconds
+            self.stage_counts[name] += 1
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self.lock:
+            return {'seconds': round(time.monotonic() - self.started, 3),
+                    'stages': {name: {'seconds': round(self.stage_seconds[name], 4), 'count': self.stage_counts[name]}
+                               for name in METRICS_STAGES if self.stage_counts[name]},
+                    'counters': dict(self.counters)}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = ['# TYPE tags_scraper_stage_seconds counter', '# TYPE tags_scraper_stage_total counter']
+        for name, stage in snapshot['stages'].items():
+            lines.append(f'tags_scraper_stage_seconds{{stage="{name}"}} {stage["seconds"]}')
+            lines.append(f'tags_scraper_stage_total{{stage="{name}"}} {stage["count"]}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE tags_scraper_{name} counter')
+            lines.append(f'tags_scraper_{name} {value}')
+        lines.append(f'tags_scraper_run_seconds {snapshot["seconds"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # .prom files get the Prometheus text format, anything else gets JSON
+        with open(path, 'w') as file:
+            if path.endswith('.prom'):
+                file.write(self.prometheus())
+            else:
+                json.dump(self.snapshot(), file, indent=2)
+
+    def progress(self, done, found, final=False):
+        # live progress line on stderr, redrawn at most a few times per second
+        now = time.monotonic()
+        if not final and now - self.last_progress < 0.5:
+            return
+        self.last_progress = now
+        elapsed = now - self.started
+        rate = done / elapsed if elapsed else 0
+        sys.stderr.write(f"\r[{done}/{found}] {rate:.1f} files/s, {self.counters['http_retries']} retries"
+                         + ('\n' if final else ''))
+        sys.stderr.flush()
+
+
+class TokenBucket:
+    # request budget shared by every worker of a run, replaces the old fixed sleep after each file
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity  # maximum number of requests that can be sent back to back
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def configure(self, rate, capacity):
+        with self.lock:
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def acquire(self):
+        # blocks until a token is available, so callers never exceed the configured rate
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # empties the bucket so that every worker waits, used when Deezer reports that the quota was exceeded
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+DEEZER_API_URL = 'https://api.deezer.com'
+DEEZER_QUOTA_ERROR_CODE = 4  # Deezer answers with a 200 and this error code in the JSON when the quota is exceeded
+HTTP_TIMEOUT = (5, 30)  # seconds to connect and to wait for data, so a hung socket can't stall the batch
+HTTP_MAX_RETRIES = 4
+HTTP_BACKOFF_BASE = 1  # seconds before the first retry, doubled on every attempt
+HTTP_BACKOFF_MAX = 30
+HTTP_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def create_http_session(api_connections=API_CONNECTIONS, cdn_connections=CDN_CONNECTIONS):
+    # one pooled session for a whole run, so connections are kept alive instead of a new handshake per request
+    session = requests.Session()
+    # pool_block makes workers wait for a free connection, which caps the connections per host
+    session.mount(DEEZER_API_URL + '/', HTTPAdapter(pool_connections=1, pool_maxsize=api_connections,
+                                                    pool_block=True))
+    cdn_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=cdn_connections, pool_block=True)
+    session.mount('https://', cdn_adapter)
+    session.mount('http://', cdn_adapter)
+    return session
+
+
+def backoff_delay(attempt, retry_after=None):
+    # exponential backoff with jitter, so workers that failed together don't retry together
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), HTTP_BACKOFF_MAX)
+    delay = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def http_get(context, url, headers=None, rate_limited=False, stream=False):
+    # returns the response, retrying timeouts, connection errors and retryable statuses, or None if they all failed
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        if rate_limited:
+            context.rate_limiter.acquire()
+        retry_after = None
+        try:
+            response = context.http_session.get(url, headers=headers, timeout=HTTP_TIMEOUT, stream=stream)
+            if response.status_code not in HTTP_RETRYABLE_STATUSES:
+                return response
+            reason = f"status {response.status_code}"
+            retry_after = response.headers.get('Retry-After')
+            # a streamed response keeps its pooled connection until it's closed, and the pools block when they're empty
+            response.close()
+        except requests.RequestException as err:
+            reason = type(err).__name__
+        if attempt == HTTP_MAX_RETRIES:
+            break
+        delay = backoff_delay(attempt, retry_after)
+        context.metrics.count('http_retries')
+        print(f"({url}) failed with {reason}, retrying in {delay:.1f}s.")
+        time.sleep(delay)
+
+    return None
+
+
+# how long (in seconds) each kind of Deezer response stays valid in the cache, albums and tracks rarely change
+CACHE_TTLS = {'search': 7 * 24 * 60 * 60, 'track': 30 * 24 * 60 * 60, 'album': 30 * 24 * 60 * 60,
+              'artist': 7 * 24 * 60 * 60}
+
+
+class ResponseCache:
+    # on-disk cache for the search, track and album responses, with a TTL per endpoint and LRU eviction
+    def __init__(self, path, ttls=None, max_bytes=CACHE_MAX_BYTES, cache_only=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttls = dict(CACHE_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only  # offline mode, a response that isn't cached is never requested
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, '
+                                'body TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, '
+                                'last_used REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.connection.commit()
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, endpoint, key):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT body, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            body, created = row
+            if now - created > self.ttls.get(endpoint, 0):  # expired responses are dropped and requested again
+                self.remove(key)
+                self.connection.commit()
+                return None
+            self.connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            self.connection.commit()
+        return json.loads(body)
+
+    def put(self, endpoint, key, data):
+        body = json.dumps(data)
+        size = len(body)
+        now = time.time()
+        with self.lock:
+            self.remove(key)
+            self.connection.execute('INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                    (key, endpoint, body, size, now, now))
+            self.total_bytes += size
+            self.evict()
+            self.connection.commit()
+
+    def remove(self, key):
+        # the caller must hold the lock
+        row = self.connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.total_bytes -= row[0]
+
+    def evict(self):
+        # removes the least recently used responses until the cache fits its size cap again
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute('SELECT key, size FROM responses ORDER BY last_used LIMIT 100').fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class CoverCache:
+    # cover art on disk for the next runs, one file per cover, with the least recently used ones removed once the
+    # folder goes over its size cap, like the response cache
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.files = OrderedDict()  # file name -> size, from the least to the most recently used
+        with os.scandir(directory) as entries:
+            covers = [entry for entry in entries if entry.name.endswith('.jpg') and entry.is_file()]
+        for entry in sorted(covers, key=lambda entry: entry.stat().st_mtime):
+            self.files[entry.name] = entry.stat().st_size
+        self.total_bytes = sum(self.files.values())
+
+    def get(self, key):
+        name = key + '.jpg'
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as cached_cover:
+                cover_data = cached_cover.read()
+            os.utime(os.path.join(self.directory, name))  # so the next runs know it was used
+        except FileNotFoundError:  # removed by another run in the meantime
+            with self.lock:
+                self.total_bytes -= self.files.pop(name, 0)
+            return None
+        with self.lock:
+            if name in self.files:
+                self.files.move_to_end(name)
+
+        return cover_data
+
+    def put(self, key, cover_data):
+        # written to a temporary file first, so another run never reads half a cover
+        name = key + '.jpg'
+        temporary_file = os.path.join(self.directory, f"{name}.{threading.get_ident()}.tmp")
+        with open(temporary_file, 'wb') as cached_cover:
+            cached_cover.write(cover_data)
+        os.replace(temporary_file, os.path.join(self.directory, name))
+        with self.lock:
+            self.total_bytes += len(cover_data) - self.files.pop(name, 0)
+            self.files[name] = len(cover_data)
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                oldest_name, oldest_size = self.files.popitem(last=False)
+                self.total_bytes -= oldest_size
+                try:
+                    os.remove(os.path.join(self.directory, oldest_name))
+                except FileNotFoundError:
+                    pass
+
+
+COVER_MEMORY_MAX_BYTES = 64 * 1024 * 1024  # cover art kept in memory during a run, the oldest covers are dropped
+ALBUM_REGISTRY_MAX_ALBUMS = 2048  # albums kept during a run, the least recently used are requested again if needed
+COVER_MAX_BYTES = 5 * 1024 * 1024  # a single cover bigger than this isn't downloaded (and isn't embedded)
+COVER_SIZES = [(250, 'cover_url_medium'), (500, 'cover_url_big'), (1000, 'cover_url_xl')]  # Deezer's cover sizes
+
+
+class AlbumEntry:
+    # everything a run knows about one album, each field is filled in once and reused by every song from it
+    def __init__(self):
+        self.lock = threading.Lock()  # held while a field is being fetched, so other workers wait for that fetch
+        self.data = None  # parsed album JSON
+        self.information = None  # album-level values computed by get_album_information
+        self.cover = None  # cover art bytes
+
+
+class AlbumRegistry:
+    # run-scoped registry keyed by album_id, so each album is requested and its cover downloaded only once
+    def __init__(self, metrics, cover_max_bytes=COVER_MEMORY_MAX_BYTES, max_albums=ALBUM_REGISTRY_MAX_ALBUMS):
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # album_id -> AlbumEntry, from the least to the most recently used
+        self.max_albums = max_albums
+        self.covers = OrderedDict()  # album_id -> cover size, from the least to the most recently used
+        self.cover_bytes = 0
+        self.cover_max_bytes = cover_max_bytes
+
+    def entry(self, album_id):
+        with self.lock:
+            if album_id not in self.entries:
+                self.entries[album_id] = AlbumEntry()
+                # a big library goes through far more albums than it needs at once, so the oldest are forgotten
+                while len(self.entries) > self.max_albums:
+                    oldest_album_id, _ = self.entries.popitem(last=False)
+                    self.cover_bytes -= self.covers.pop(oldest_album_id, 0)
+            else:
+                self.entries.move_to_end(album_id)
+            return self.entries[album_id]
+
+    def get(self, album_id, field, loader):
+        # returns the field if it's already known, otherwise loads it while concurrent callers wait for the result
+        entry = self.entry(album_id)
+        with entry.lock:
+            value = getattr(entry, field)
+            if value is None:
+                value = loader()
+                if value:  # failed requests aren't kept, so the next song from the album tries again
+                    setattr(entry, field, value)
+                    if field == 'cover':
+                        self.track_cover(album_id, len(value))
+            else:
+                self.metrics.count('album_registry_hits')
+                if field == 'cover':
+                    with self.lock:
+                        self.covers.move_to_end(album_id)
+        return value
+
+    def track_cover(self, album_id, size):
+        # covers are the only large values, so they are dropped once the memory budget is exceeded
+        with self.lock:
+            self.covers[album_id] = size
+            self.cover_bytes += size
+            while self.cover_bytes > self.cover_max_bytes and len(self.covers) > 1:
+                oldest_album_id, oldest_size = self.covers.popitem(last=False)
+                if oldest_album_id in self.entries:
+                    self.entries[oldest_album_id].cover = None
+                self.cover_bytes -= oldest_size
+
+
+# mutagen class for each supported format, a new format needs an entry here, in TAG_KEYS and in write_tags
+AUDIO_FORMATS = {'.mp3': MP3, '.flac': FLAC, '.m4a': MP4}
+# where each format keeps the artist, title, album, album artist and year
+TAG_KEYS = {
+    '.mp3': ('TPE1', 'TIT2', 'TALB', 'TPE2', 'TDRC'),
+    '.flac': ('artist', 'title', 'album', 'albumartist', 'date'),
+    '.m4a': ('\xa9ART', '\xa9nam', '\xa9alb', 'aART', '\xa9day'),
+}
+
+
+class AudioRecord:
+    # what the pipeline knows about a file, read by a single scan and passed along until its tags are written back
+    __slots__ = ('directory', 'filename', 'extension', 'size', 'artist', 'title', 'album', 'albumartist', 'year',
+                 'search_name', 'content_hash', 'journal_id', 'state', 'resolved', 'match', 'fingerprint')
+
+    def __init__(self, directory, filename, tags, size):
+        self.directory = directory
+        self.filename = filename  # current name of the file in the directory
+        self.extension = os.path.splitext(filename)[1].lower()
+        self.size = size
+        self.artist, self.title, self.album, self.albumartist, self.year = \
+            [tag_text(tags, key) for key in TAG_KEYS[self.extension]]
+        self.search_name = song_search_name(filename, self.artist, self.title, self.extension)
+        self.content_hash = None  # hash of the file as it is on disk, so the journal recognises it after a rename
+        self.journal_id = None
+        self.state = 'scanned'  # how far the file got: scanned, matched, renamed or sorted
+        self.resolved = None  # the tags found on Deezer, kept so an interrupted file doesn't need them again
+        self.match = None  # the Deezer track picked by the album-first mode, so the song doesn't have to be searched
+        self.fingerprint = None  # hash of the audio without the tags, only computed when the fingerprint index is on
+
+    @property
+    def path(self):
+        return self.directory + '/' + self.filename
+
+
+JOURNAL_FILE = '.tags_scraper_journal.sqlite'
+CONTENT_HASH_BYTES = 64 * 1024  # bytes read from the start and the end of a file for its content hash
+
+
+class Journal:
+    # per-directory log of how far each file got, so an interrupted batch picks up where it stopped
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, JOURNAL_FILE), check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, filename TEXT NOT NULL, '
+                                'content_hash TEXT NOT NULL, state TEXT NOT NULL, track_id INTEGER, '
+                                'album_id INTEGER, resolved TEXT, updated REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)')
+        self.connection.commit()
+
+    def resume(self, record):
+        # files are found by their contents, so the ones renamed since the last run are still recognised, but a copy
+        # of a file that's still where the journal saw it is a file of its own
+        with self.lock:
+            rows = self.connection.execute('SELECT id, state, resolved, filename FROM files WHERE content_hash = ? '
+                                           'ORDER BY updated DESC', (record.content_hash,)).fetchall()
+        name = self.name(record)
+        for journal_id, state, resolved, filename in rows:
+            if filename == name or not os.path.exists(os.path.join(self.directory, filename)):
+                record.journal_id, record.state = journal_id, state
+                record.resolved = load_resolved(resolved)
+                return
+        self.update(record, 'scanned')
+
+    def name(self, record):
+        # the path in the directory, so the same library mounted somewhere else is still recognised
+        return os.path.relpath(record.path, self.directory)
+
+    def update(self, record, state):
+        record.state = state
+        resolved = dump_resolved(record.resolved)
+        track_id = record.resolved['final_result']['id'] if record.resolved else None
+        album_id = record.resolved['final_result']['album_id'] if record.resolved else None
+        with self.lock:
+            if record.journal_id is None:
+                cursor = self.connection.execute('INSERT INTO files (filename, content_hash, state, track_id, '
+                                                 'album_id, resolved, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                                 (self.name(record), record.content_hash, state, track_id,
+                                                  album_id, resolved, time.time()))
+                record.journal_id = cursor.lastrowid
+            else:
+                # a record whose tags were already let go of keeps the ones saved before
+                self.connection.execute('UPDATE files SET filename = ?, content_hash = ?, state = ?, '
+                                        'track_id = COALESCE(?, track_id), album_id = COALESCE(?, album_id), '
+                                        'resolved = COALESCE(?, resolved), updated = ? WHERE id = ?',
+                                        (self.name(record), record.content_hash, state, track_id, album_id,
+                                         resolved, time.time(), record.journal_id))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def innermost_folder(folders, directory):
+    # the folder a directory belongs to, the innermost one when one folder is inside another (None outside them all)
+    return max((folder for folder in folders if directory == folder or directory.startswith(folder + '/')), key=len,
+               default=None)
+
+
+def songs_by_folder(folders, paths):
+    # each song goes to the folder it was dropped in, once, even when that folder is inside another watched one
+    groups = {}
+    for path in paths:
+        folder = innermost_folder(folders, os.path.dirname(path))
+        if folder is not None:
+            groups.setdefault(folder, []).append(path)
+    return groups
+
+
+class FolderJournals:
+    # the journals of the watched folders, each song goes to the journal of the folder it was dropped in
+    def __init__(self, folders):
+        self.journals = {folder: Journal(folder) for folder in folders}
+
+    def journal(self, record):
+        return self.journals[innermost_folder(self.journals, record.directory)]
+
+    def resume(self, record):
+        self.journal(record).resume(record)
+
+    def update(self, record, state):
+        self.journal(record).update(record, state)
+
+    def close(self):
+        for journal in self.journals.values():
+            journal.close()
+
+
+class DecisionDeferred(Exception):
+    # a headless run met a question only the user can answer, the song waits for the decisions file
+    pass
+
+
+class Decisions:
+    # the questions a headless run left for later with their options, and the answers once the user fills them in
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.entries = json.load(file)
+
+    def choice(self, key, question, options, valid):
+        # the saved answer, otherwise the question is saved and the song is put off
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.get('choice') in valid:
+                return entry['choice']
+            if entry is None:
+                self.entries[key] = {'question': question, 'options': options, 'choice': None}
+                self.save()
+        raise DecisionDeferred(question)
+
+    def pending(self):
+        with self.lock:
+            return sum(1 for entry in self.entries.values() if entry.get('choice') is None)
+
+    def save(self):
+        # the workers sharing a library save their questions to the same file, so the ones already in it are merged
+        # in under a lock, and it's replaced in one step so the user never opens a half-written file
+        directory, name = os.path.split(os.path.abspath(self.path))
+        with folder_lock(directory, name):
+            if os.path.exists(self.path):
+                with open(self.path, encoding='utf-8') as file:
+                    for key, entry in json.load(file).items():
+                        # the answers filled in since this file was read are kept too
+                        if key not in self.entries or self.entries[key].get('choice') is None:
+                            self.entries[key] = entry
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(self.entries, file, indent=2, ensure_ascii=False)
+            os.replace(self.path + '.tmp', self.path)
+
+
+def discover_audio_files(directory, recursive=False, extensions=AUDIO_EXTENSIONS, skip=()):
+    # yields (directory, filename) folder by folder, so the first song can be searched before the tree is read, but
+    # a folder's names are all read before any is yielded, since its songs are renamed while it's being listed and
+    # would be found again under their new names (hidden files, like the tag writers' copies, are never songs)
+    songs = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_file():
+                    if os.path.splitext(entry.name)[1].lower() in extensions:
+                        songs.append(entry.name)
+                elif recursive and entry.is_dir() and entry.path not in skip:
+                    subdirectories.append(entry.path)
+    except OSError as err:
+        print(f"({directory}) couldn't be read: {err}")
+    for song in songs:
+        yield directory, song
+
+    # subfolders are read after the current folder is closed, so a deep tree doesn't keep a handle open per level
+    for subdirectory in subdirectories:
+        yield from discover_audio_files(subdirectory, recursive, extensions, skip)
+
+
+def discover_music(context, directory, recursive=False, extensions=AUDIO_EXTENSIONS):
+    # the Songs folder is where sorted songs end up, so it's never searched for new ones
+    for song_directory, item in discover_audio_files(directory, recursive, extensions, skip={directory + '/Songs'}):
+        record = read_record(context, song_directory, item)
+        if record is not None:
+            yield record
+
+
+def read_record(context, directory, item):
+    # read the file's tags once, they're only written back after the song has been found
+    try:
+        with context.metrics.stage('scan'):
+            record = scan_audio_file(directory, item)
+    except Exception as err:  # a file mutagen can't read is reported and left as it is
+        print(f"Song ({item}) couldn't be read: {err}")
+        return None
+    if context.journal is not None:
+        context.journal.resume(record)
+        if record.state in ('renamed', 'sorted'):
+            print(f"Song ({item}) was already edited in a previous run.")
+            return None
+
+    return record
+
+
+def id3_header_size(header):
+    # the ID3v2 tag size is stored as a syncsafe integer (7 bits per byte) in the 10 byte header
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    footer = 10 if header[5] & 0x10 else 0
+
+    return 10 + size + footer
+
+
+def tag_text(tags, key):
+    # ID3 frames keep their values in .text, FLAC and MP4 tags are plain lists
+    value = tags.get(key) if tags is not None else None
+    if value is None:
+        return None
+    text = getattr(value, 'text', value)
+
+    return str(text[0]) if text else None
+
+
+def load_tags(file, extension):
+    if extension == '.mp3':
+        try:
+            return ID3(file)
+        except ID3NoHeaderError:
+            return None
+
+    return AUDIO_FORMATS[extension](file).tags
+
+
+def scan_audio_file(directory, audio_file):
+    # one open per file for the tags, size and content hash
+    with open(directory + '/' + audio_file, 'rb') as file:
+        status = os.fstat(file.fileno())
+        head = file.read(CONTENT_HASH_BYTES)
+        content_hash = content_hash_from_file(file, head, status.st_size)
+        file.seek(0)
+        tags = load_tags(file, os.path.splitext(audio_file)[1].lower())
+
+    record = AudioRecord(directory, audio_file, tags, status.st_size)
+    record.content_hash = content_hash
+
+    return record
+
+
+def content_hash_from_file(file, head, size):
+    # the size plus the first and last bytes of the file tell files apart without reading all of it
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    digest.update(head)
+    if size > 2 * CONTENT_HASH_BYTES:
+        file.seek(size - CONTENT_HASH_BYTES)
+        digest.update(file.read(CONTENT_HASH_BYTES))
+
+    return digest.hexdigest()
+
+
+def content_hash(path):
+    with open(path, 'rb') as file:
+        return content_hash_from_file(file, file.read(CONTENT_HASH_BYTES), os.fstat(file.fileno()).st_size)
+
+
+ID3V1_SIZE = 128
+APE_FOOTER_SIZE = 32
+
+
+def audio_bounds(file, size, extension):
+    # where the audio starts and ends, everything around it is tags that change when the song is retagged
+    file.seek(0)
+    start = id3_header_size(file.read(10))  # some FLAC files have an ID3v2 tag in front as well
+    end = size
+    if extension == '.m4a':
+        # the audio is the mdat atom, the tags are in moov before or after it
+        offset = 0
+        while offset + 8 <= size:
+            file.seek(offset)
+            header = file.read(16)
+            atom_size, atom_type = int.from_bytes(header[:4], 'big'), header[4:8]
+            header_size = 8
+            if atom_size == 1:  # 64-bit size
+                atom_size, header_size = int.from_bytes(header[8:16], 'big'), 16
+            elif atom_size == 0:  # the last atom runs to the end of the file
+                atom_size = size - offset
+            if atom_type == b'mdat':
+                return offset + header_size, offset + atom_size
+            if atom_size < header_size:
+                break
+            offset += atom_size
+        return 0, size
+    if extension == '.flac':
+        # metadata blocks come first, each with a 4 byte header saying if it's the last one
+        file.seek(start)
+        if file.read(4) == b'fLaC':
+            start += 4
+            while start < size:
+                header = file.read(4)
+                if len(header) < 4:
+                    break
+                start += 4 + int.from_bytes(header[1:4], 'big')
+                if header[0] & 0x80:
+                    break
+                file.seek(start)
+    # ID3v1 and APEv2 tags are appended after the audio, in either order
+    while True:
+        if end - start >= APE_FOOTER_SIZE:
+            file.seek(end - APE_FOOTER_SIZE)
+            footer = file.read(APE_FOOTER_SIZE)
+            if footer[:8] == b'APETAGEX':
+                tag_size = int.from_bytes(footer[12:16], 'little')  # the items and the footer
+                has_header = int.from_bytes(footer[20:24], 'little') & 0x80000000
+                end -= tag_size + (APE_FOOTER_SIZE if has_header else 0)
+                continue
+        if end - start >= ID3V1_SIZE:
+            file.seek(end - ID3V1_SIZE)
+            if file.read(3) == b'TAG':
+                end -= ID3V1_SIZE
+                continue
+        break
+
+    return start, max(start, end)
+
+
+def audio_fingerprint(path, extension, use_mmap=False):
+    # the same audio has the same fingerprint whatever its tags and name, xxhash is used when it's installed
+    digest = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        start, end = audio_bounds(file, size, extension)
+        if use_mmap and end > start:
+            # hashed straight from the page cache, without copying the file into Python
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view, \
+                    view[start:end] as audio:
+                digest.update(audio)
+        else:
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = file.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+
+    return ('xxh3:' if xxhash is not None else 'b2:') + digest.hexdigest()
+
+
+class FingerprintIndex:
+    # audio fingerprint -> the Deezer tags found for it and where it was sorted, shared by every folder and run
+    def __init__(self, path, use_mmap=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.use_mmap = use_mmap
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY, '
+                                'track_id INTEGER, resolved TEXT, sorted_path TEXT, updated REAL NOT NULL)')
+        self.connection.commit()
+
+    def fingerprint(self, record):
+        if record.fingerprint is None:
+            record.fingerprint = audio_fingerprint(record.path, record.extension, self.use_mmap)
+        return record.fingerprint
+
+    def get(self, fingerprint):
+        with self.lock:
+            row = self.connection.execute('SELECT resolved FROM fingerprints WHERE fingerprint = ?',
+                                          (fingerprint,)).fetchone()
+        return load_resolved(row[0]) if row is not None else None
+
+    def put(self, fingerprint, resolved):
+        with self.lock:
+            self.connection.execute('INSERT INTO fingerprints (fingerprint, track_id, resolved, updated) '
+                                    'VALUES (?, ?, ?, ?) ON CONFLICT (fingerprint) DO UPDATE SET '
+                                    'track_id = excluded.track_id, resolved = excluded.resolved, '
+                                    'updated = excluded.updated',
+                                    (fingerprint, resolved['final_result']['id'], dump_resolved(resolved), time.time()))
+            self.connection.commit()
+
+    def sorted_path(self, fingerprint):
+        with self.lock:
+            row = self.connection.execute('SELECT sorted_path FROM fingerprints WHERE fingerprint = ?',
+                                          (fingerprint,)).fetchone()
+        return row[0] if row is not None else None
+
+    def sorted(self, fingerprint, path):
+        with self.lock:
+            self.connection.execute('INSERT INTO fingerprints (fingerprint, sorted_path, updated) VALUES (?, ?, ?) '
+                                    'ON CONFLICT (fingerprint) DO UPDATE SET sorted_path = excluded.sorted_path, '
+                                    'updated = excluded.updated', (fingerprint, path, time.time()))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def song_search_name(audio_file, artist, title, extension):
+    # files that were already edited are searched by their tags instead of their filename
+    if artist and title:
+        # if song title has features with (), this removes them from the title so that the search request works properly
+        if '(feat.' in title:
+            title = title.split('(')[0].strip()
+        # in case Deezer's database has the features for a song without ()
+        if 'feat.' in title:
+            title = title.split('feat.')[0].strip()
+        audio_file = f"{artist} - {title}{extension}"
+
+    return audio_file
+
+
+PAYLOAD_FIELDS = frozenset({'data', 'id', 'title', 'name', 'artist', 'album', 'cover_medium', 'cover_big', 'cover_xl',
+                            'bpm', 'contributors', 'genres', 'release_date', 'tracks', 'error', 'code', 'message',
+                            'next'})
+
+
+def trim_payload(value):
+    # only the fields that are read are kept, in memory and in the cache, an album's tracks carry dozens more
+    if isinstance(value, dict):
+        return {key: trim_payload(item) for key, item in value.items() if key in PAYLOAD_FIELDS}
+    if isinstance(value, list):
+        return [trim_payload(item) for item in value]
+
+    return value
+
+
+class TrackResult:
+    # the Deezer track a song is tagged with, read and written like the dict it replaced but a third of the size
+    __slots__ = ('id', 'artist', 'title', 'album_title', 'cover_url_medium', 'cover_url_big', 'cover_url_xl',
+                 'album_id', 'title_contributors', 'bpm', 'track_number', 'total_tracks')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        if self.title_contributors is None:
+            self.title_contributors = ''
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        # a field that was never filled in counts as missing, like a key the dict didn't have
+        return name in self.__slots__ and getattr(self, name) is not None
+
+    def keys(self):
+        return self.__slots__
+
+    def copy(self):
+        return TrackResult(**self.as_dict())
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+def dump_resolved(resolved):
+    return json.dumps(resolved, default=TrackResult.as_dict) if resolved else None
+
+
+def load_resolved(text):
+    if not text:
+        return None
+    resolved = json.loads(text)
+    resolved['final_result'] = TrackResult(**resolved['final_result'])
+
+    return resolved
+
+
+def deezer_request(context, endpoint, url):
+    # the language is part of the key because Deezer translates the genre names
+    cache_key = f"{url} {context.headers.get('Accept-Language', '')}"
+    response_cache = context.response_cache
+    if response_cache is not None:
+        cached_response = response_cache.get(endpoint, cache_key)
+        if cached_response is not None:
+            context.metrics.count('cache_hits')
+            return cached_response
+        context.metrics.count('cache_misses')
+        if response_cache.cache_only:
+            print(f"({url}) isn't cached and the cache-only mode is on, so it won't be requested.")
+            return {}
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        response = http_get(context, url, context.headers, rate_limited=True)
+        if response is None or response.status_code != 200:
+            print("Something went wrong. Please check the API and try again.")
+            return {}
+
+        context.metrics.count('api_requests')
+        context.metrics.count('bytes_downloaded', len(response.content))
+        parse_json = trim_payload(json.loads(response.text))
+        error = parse_json.get('error')
+        if not isinstance(error, dict) or error.get('code') != DEEZER_QUOTA_ERROR_CODE:
+            break
+        # every worker has to slow down, not just this one, so the whole request budget waits
+        delay = backoff_delay(attempt)
+        context.rate_limiter.pause(delay)
+        context.metrics.count('quota_errors')
+        print(f"Deezer's quota was exceeded, waiting {delay:.1f}s.")
+    else:
+        print("Deezer's quota is still exceeded. Please lower the request budget and try again.")
+        return {}
+    if response_cache is not None and 'error' not in parse_json:  # errors are never cached so they can be retried
+        response_cache.put(endpoint, cache_key, parse_json)
+
+    return parse_json
+
+
+def search_request(context, artist_for_url, title_for_url):
+    # the loose hyphen slug, a full page of everything that looks like it
+    parse_json_search = deezer_request(context, 'search', f"{DEEZER_API_URL}/search?q={artist_for_url}-{title_for_url}")
+
+    return parse_json_search
+
+
+def track_search_request(context, artist, title):
+    # Deezer's advanced search syntax, only the few tracks by that artist with that title come back
+    artist, title = artist.replace('"', ''), title.replace('"', '')  # the quotes would end the fields
+    query = urlencode({'q': f'artist:"{artist}" track:"{title}"', 'limit': SEARCH_LIMIT})
+    parse_json_search = deezer_request(context, 'search', f"{DEEZER_API_URL}/search?{query}")
+
+    return parse_json_search
+
+
+def album_search_request(context, artist, album):
+    # Deezer's advanced search syntax, only the albums by that artist with that title come back
+    artist, album = artist.replace('"', ''), album.replace('"', '')  # the quotes would end the fields
+    query = urlencode({'q': f'artist:"{artist}" album:"{album}"', 'limit': 10})
+    parse_json_search = deezer_request(context, 'search', f"{DEEZER_API_URL}/search/album?{query}")
+
+    return parse_json_search
+
+
+EXCLUDED_VERSIONS = frozenset({'acoustic', 'live', 'bonus'})  # skipped unless the song's own title has the word
+
+
+@lru_cache(maxsize=8192)
+def match_tokens(text):
+    # casefolded words without accents or punctuation, each distinct title or name is only split once
+    return tuple(WORDS.findall(fold_accents(text).casefold()))
+
+
+def contains_tokens(tokens, wanted):
+    # whole-word version of "wanted in text", so "live" isn't found in "Oliver"
+    if not wanted:
+        return True
+    size = len(wanted)
+
+    return any(tokens[n:n + size] == wanted for n in range(len(tokens) - size + 1))
+
+
+def get_results(data, title_for_check, artists_for_check):
+    # create results list, best matches first
+    scored_results = []
+
+    if data:
+        title_tokens = match_tokens(title_for_check)
+        artist_tokens = [match_tokens(artist) for artist in artists_for_check]
+        excluded = EXCLUDED_VERSIONS.difference(title_tokens)
+        for n, result in enumerate(data):  # for index and result in the data we just requested
+            result_title_tokens = match_tokens(result['title'])
+            result_artist_tokens = match_tokens(result['artist']['name'])
+            if excluded.intersection(result_title_tokens) or not contains_tokens(result_title_tokens, title_tokens):
+                continue
+            # just one of the artists needs to be found, the closest one counts
+            artist_scores = [len(artist) / len(result_artist_tokens) for artist in artist_tokens
+                             if result_artist_tokens and contains_tokens(result_artist_tokens, artist)]
+            if not artist_scores:
+                continue
+            # the share of the result's words that were searched for, "OTW" beats "OTW (Remix)"
+            score = len(title_tokens) / max(len(result_title_tokens), 1) * 2 + max(artist_scores)
+            scored_results.append((-score, n, result))
+
+    # ties keep Deezer's order, which puts the most popular version first
+    return [assign_results_to_result_list(result) for _, _, result in sorted(scored_results, key=lambda x: x[:2])]
+
+
+def assign_results_to_result_list(result):
+    # create the song tags
+    current_result = TrackResult(id=result['id'], artist=result['artist']['name'], title=result['title'],
+                                 album_title=result['album']['title'], cover_url_medium=result['album']['cover_medium'],
+                                 cover_url_big=result['album']['cover_big'], cover_url_xl=result['album']['cover_xl'],
+                                 album_id=result['album']['id'])
+
+    return current_result  # adds all the results to a list so that we can choose the one we want
+
+
+SEARCH_LIMIT = 10  # results asked for by the structured queries, the right track is nearly always among the first
+FEATURING = re.compile(r'\s*[(\[]?\b(?:feat|ft|featuring)\b\.?.*$', re.IGNORECASE)
+
+
+def strip_featuring(text):
+    # "Title (feat. Someone)" -> "Title", Deezer often leaves the featured artists out of its titles and names
+    return FEATURING.sub('', text).strip() or text
+
+
+def search_plan(artist, title, artists_for_check):
+    # the queries from the strictest to the loosest, each with the title and artists its results are checked against
+    plain_artist, plain_title = strip_featuring(artist), strip_featuring(title)
+    plain_artists = [strip_featuring(name) for name in artists_for_check]
+    plan = [('advanced', artist, title, title, artists_for_check),
+            ('no_feat', plain_artist, plain_title, plain_title, plain_artists),
+            ('folded', fold_accents(plain_artist), fold_accents(plain_title), plain_title, plain_artists)]
+    if len(plain_artists) > 1:  # "A & B" is usually filed under A or B alone
+        plan.extend(('split', name, plain_title, plain_title, plain_artists) for name in plain_artists)
+
+    return plan
+
+
+def search_song(context, artist_for_url, title_for_url, title_for_check, audio, artists_for_check):
+    # works through the search plan until a query has results that pass the checks, the hyphen slug of the older
+    # versions is the last resort
+    tried = set()
+    for attempt, artist, title, check_title, check_artists in search_plan(audio[0].strip(), title_for_check,
+                                                                          artists_for_check):
+        if (artist, title) in tried:  # folding or stripping didn't change anything
+            continue
+        tried.add((artist, title))
+        results = get_results(track_search_request(context, artist, title).get('data'), check_title, check_artists)
+        context.metrics.count(f"search_{attempt}_{'hits' if results else 'misses'}")
+        log.debug("SEARCH %s (%s - %s): %d results", attempt.upper(), artist, title, len(results))
+        if results:
+            return results
+
+    results = get_results(search_request(context, artist_for_url, title_for_url).get('data'), title_for_check,
+                          artists_for_check)
+    context.metrics.count(f"search_slug_{'hits' if results else 'misses'}")
+    log.debug("SEARCH SLUG (%s-%s): %d results", artist_for_url, title_for_url, len(results))
+
+    return results
+
+
+def print_search_error(artist_for_check, title_for_check):
+    print(f"({artist_for_check} - {title_for_check}) isn't available yet in Deezer's database.")
+    print("Check for any spelling errors and if the right syntax is being used.")
+
+
+def is_greatest_hits(result):
+    return contains_tokens(match_tokens(result['album_title']), ('greatest', 'hits'))
+
+
+def avoid_singles_automatically(context, number_results, results, final_result):
+    if number_results > 1:
+        if results[0]['title'] != results[0]['album_title']:
+            if is_greatest_hits(results[0]):
+                final_result = results[1]
+            else:
+                final_result = results[0]
+        elif results[1]['title'] == results[1]['album_title'] and \
+                results[0]['title'] == results[0]['album_title']:
+            final_result = results[1]
+        else:
+            album_contributors = []
+            genres = []
+            # the album is requested once per run, so every song of it picks the same version, and when its version
+            # is picked (most of the time) it's the album request the song needs anyway
+            check_album = album_request(context, results[1])
+            if check_album:
+                for contributor in check_album['contributors']:
+                    album_contributors.append(contributor['name'])  # add the album artists to a list
+                for genre in check_album['genres']['data']:
+                    genres.append(genre['name'])
+            if 'Various Artists' in album_contributors or \
+                    'Film Scores' in genres or \
+                    'Films/Games' in genres or \
+                    'REMIX' in results[1]['title'].upper() or \
+                    'REMIX' in results[1]['album_title'].upper():
+                final_result = results[0]
+            else:
+                final_result = results[1]
+    elif number_results == 1:
+        final_result = results[0]
+
+    return final_result
+
+
+def print_results_and_pick_one(context, results, automated, avoid_singles, song='', contributors=False):
+    # calculates the number of results for later
+    number_results = len(results)
+
+    # if there are no results, return an empy dictionary
+    if not number_results:
+        return {}
+
+    user_choice = 0  # setting user_choice to 0 so that we can then change it to whatever the user chooses
+    total_songs_for_user_choice = 0
+    final_result = {}
+    for n, result in enumerate(results):
+        # number of results to be displayed (10)
+        if n + 1 < 10:
+            # shows the results up to 10 in total so that the user can pick one, they're only details when automated
+            log.log(logging.DEBUG if automated else logging.INFO, "VERSION: %s %s", n + 1, result)
+            total_songs_for_user_choice += 1
+        else:
+            break
+
+    if automated:
+        if avoid_singles:
+            final_result = avoid_singles_automatically(context, number_results, results, final_result)
+        elif not avoid_singles:
+            if number_results > 1 and results[0]['title'] != results[0]['album_title'] and \
+                    is_greatest_hits(results[0]):
+                final_result = results[1]
+            else:
+                final_result = results[0]
+
+    elif not automated:
+        decisions = context.decisions
+        if number_results > 1 and decisions is not None:  # headless, the version is picked in the decisions file
+            options = [{'artist': result['artist'], 'title': result['title'], 'album': result['album_title'],
+                        'id': result['id']} for result in results[:total_songs_for_user_choice]]
+            try:
+                user_choice = decisions.choice(f'version {song}', f"Which version of {song}? [1-{len(options)}]",
+                                               options, range(1, len(options) + 1))
+            except DecisionDeferred:
+                # --apply-decisions is cache-only, so whichever version is picked needs its details cached now
+                cache_versions(context, results[:total_songs_for_user_choice], contributors)
+                raise
+            final_result = results[user_choice - 1]
+        elif number_results > 1:  # if there are multiple results, let the user pick one
+            while True:
+                try:
+                    user_choice = int(input(f"Which version? [1-{total_songs_for_user_choice}]: "))
+                    if user_choice <= 0 or user_choice > total_songs_for_user_choice:
+                        print("Invalid choice, try again.")
+                    else:
+                        final_result = results[user_choice - 1]
+                        break
+                except ValueError:
+                    print(f"Invalid choice, please input a valid number between {1}-{total_songs_for_user_choice}.")
+        elif number_results == 1:  # if there's just one result, use it
+            final_result = results[0]
+    if final_result['artist'] == 'Ghostemane':  # ghostemane is capitalized in deezer's db, I prefer it this way
+        final_result['artist'] = 'GHOSTEMANE'
+
+    return final_result
+
+
+def track_request(context, final_result):
+    parse_json_track = deezer_request(context, 'track', f"{DEEZER_API_URL}/track/{final_result['id']}")
+
+    return parse_json_track
+
+
+def cache_versions(context, results, contributors=False):
+    # the track, album and cover of every version listed in the decisions file, the responses and covers end up in
+    # the caches (the track whenever resolve_audio_file will ask for it)
+    for result in results:
+        if context.track_details.fetch_bpm or contributors:
+            track_request(context, result)
+        album_request(context, result)
+        album_cover(context, result)
+
+
+class TrackDetails:
+    # loads /track/{id} for the run's songs with a bounded number of requests in flight, starting as soon as the ids
+    # are known, so the details are usually ready by the time a song needs them
+    def __init__(self, context, concurrency=4, fetch_bpm=True):
+        self.context = context
+        self.fetch_bpm = fetch_bpm  # without the BPM, the contributors come from the search payload instead
+        self.lock = threading.Lock()
+        self.pending = {}  # track id -> [Future, songs waiting for it]
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency)) if fetch_bpm else None
+
+    def submit(self, track_id):
+        # the request already in flight for the track, or a new one, called with the lock held
+        entry = self.pending.get(track_id)
+        if entry is None:
+            entry = self.pending[track_id] = [self.executor.submit(track_request, self.context, {'id': track_id}), 0]
+
+        return entry
+
+    def prefetch(self, track_ids):
+        if not self.fetch_bpm:
+            return
+        with self.lock:
+            for track_id in track_ids:
+                self.submit(track_id)
+
+    def get(self, final_result, contributors=False):
+        # without the BPM, the track is still requested when its contributors are wanted for the artist and title tags
+        if not self.fetch_bpm:
+            if contributors:
+                return track_request(self.context, final_result)
+            return {'contributors': [{'name': final_result['artist']}]}
+        # duplicate songs can ask for the same track at the same time, they all wait for the one request and the
+        # last of them lets it go
+        with self.lock:
+            entry = self.submit(final_result['id'])
+            entry[1] += 1
+        try:
+            return entry[0].result()
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1] and self.pending.get(final_result['id']) is entry:
+                    del self.pending[final_result['id']]
+
+    def discard(self, track_id):
+        # a prefetched track no song is waiting for anymore is let go, and isn't requested at all if it hasn't started
+        with self.lock:
+            entry = self.pending.get(track_id)
+            if entry is not None and not entry[1]:
+                entry[0].cancel()
+                del self.pending[track_id]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def needs_contributors(audio, title_for_check):
+    # a filename with several artists or featured ones needs the contributors, even when the BPM isn't wanted
+    return '&' in audio[0] or FEATURING.search(title_for_check) is not None
+
+
+def track_bpm(data, final_result):
+    final_result['bpm'] = str(data['bpm']) if 'bpm' in data.keys() and data['bpm'] != 0 else 'N/A'
+
+    return final_result
+
+
+def get_artists(data, audio, final_result):
+    track_contributors = []
+    for contributor in data:
+        track_contributors.append(contributor['name'])  # adds every artist to a list
+    final_contributors = []
+    if len(track_contributors) > 1:  # if there is more than one artist
+        # added this feature due to personal taste, since I want some songs to have all artists in the artist tag
+        if '&' in audio[0].strip():  # first check if the artist was already present in the filename
+            final_result['artist'] = ''
+            for contributor in track_contributors:
+                final_result['artist'] += contributor + ' & '
+            final_result['artist'] = final_result['artist'][:-3]
+        else:  # if the artist wasn't in the filename
+            for contributor in track_contributors:
+                # check if the artist is present in the song name to avoid repeating it
+                if contributor.lower() not in final_result['artist'].lower() \
+                        and contributor.lower() not in final_result['title'].lower():
+                    final_contributors.append(contributor)
+            log.debug("FINAL CONTRIBUTORS: %s", final_contributors)
+            if len(final_contributors) == 1:  # if there's only one extra artist
+                if 'feat.' not in final_result['title'].lower():  # check if it's already present in the song name
+                    final_result['title_contributors'] = final_result['title'] + \
+                                                         f' (feat. {final_contributors[0]}' + ')'
+                else:  # if it's not present then add it and change the string to match it
+                    final_result['title_contributors'] = final_result['title'][:-1] + \
+                                                         ' & ' + final_contributors[0] + ')'
+            elif len(final_contributors) > 1:  # if there's more than 1 extra artist
+                final_result['title_contributors'] = final_result['title'] + ' (feat. '
+                for contributor in final_contributors:
+                    final_result['title_contributors'] += f'{contributor}' + ' & '  # prepare the string to add
+                final_result['title_contributors'] = final_result['title_contributors'][:-3] + ')'  # add artists
+    log.debug("FINAL RESULT TITLE CONTRIBUTORS: %s", final_result['title_contributors'])
+
+    return final_result
+
+
+def album_request(context, final_result):
+    # songs from the same album share one request per run
+    parse_json_album = context.albums.get(
+        final_result['album_id'], 'data',
+        lambda: (context.catalogue is not None and context.catalogue.album(final_result['album_id']))
+        or deezer_request(context, 'album', f"{DEEZER_API_URL}/album/{final_result['album_id']}"))
+
+    return parse_json_album
+
+
+def album_information(context, data, automated):
+    # everything here is the same for every song of the album, so it's only computed once per run
+    various_artists = 0
+    album_contributors = []
+    genres = []
+    genres_for_tag = ''
+    album_tracks = data['tracks']
+    track_count = len(album_tracks['data'])  # count the number of tracks on the album
+    album_genres = data['genres']['data']
+    release_date = data['release_date'][:4]  # choose the year of the release date
+    for contributor in data['contributors']:
+        album_contributors.append(contributor['name'])  # add the album artists to a list
+    if 'Various Artists' in album_contributors:  # check if Various Artists is in the list
+        log.debug("VARIOUS ARTISTS DETECTED")
+        # ask if user wants to set the album artist tag to Various Artists or not
+        if automated:
+            various_artists = 1
+        elif context.decisions is not None:  # headless, the answer comes from the decisions file
+            various_artists = context.decisions.choice(
+                f"various artists {data['id']}",
+                f"Do you want to put Album Artist as Various Artists for {data['title']}? (Yes = 1 / No = 0)",
+                album_contributors, (0, 1))
+        elif not automated:
+            while True:
+                various_artists = input("Do you want to put Album Artist as Various Artists? (Yes = 1 / No = 0): ")
+                if various_artists != "1" and various_artists != "0":
+                    print("Please input a valid option (Yes = 1 / No = 0).")
+                else:
+                    various_artists = int(various_artists)
+                    break
+
+    # map the track titles to their number on the album, so that each song doesn't have to scan the whole list
+    track_titles = []
+    track_numbers = {}
+    for n, s in enumerate(album_tracks['data']):
+        title_upper = s['title'].upper()
+        track_titles.append(title_upper)
+        track_numbers.setdefault(title_upper, n + 1)
+
+    # change formatting on some genres, personal taste
+    for n, genre in enumerate(album_genres):
+        if album_genres[n]['name'] == 'Rap/Hip Hop':
+            album_genres[n]['name'] = 'Hip-Hop/Rap'
+        if album_genres[n]['name'] == 'Pop Indie':
+            album_genres[n]['name'] = 'Indie Pop'
+        genres.append(album_genres[n]['name'])  # add them all to a list
+
+    # format the genres
+    length_genres = len(genres)  # get the number of genres
+    log.debug("NUMBER OF GENRES: %s", length_genres)
+    if length_genres > 1:  # if it has more than 1 genre
+        for genre in genres:
+            genres_for_tag = genres_for_tag + genre + '/'  # put them all together i.e: rock/pop/rap
+        genres_for_tag = genres_for_tag[:-1]
+    elif length_genres == 1:  # if it only has one genre use it
+        genres_for_tag = genres[0]
+
+    return {'track_count': track_count, 'album_genres': album_genres, 'release_date': release_date,
+            'various_artists': various_artists, 'genres': genres, 'genres_for_tag': genres_for_tag,
+            'track_titles': track_titles, 'track_numbers': track_numbers}
+
+
+def get_album_information(context, data, automated, title_for_check, final_result):
+    try:
+        album = context.albums.get(final_result['album_id'], 'information',
+                                   lambda: album_information(context, data, automated))
+    except DecisionDeferred:
+        # --apply-decisions is cache-only, so the cover is cached now, before the song waits for the answer
+        album_cover(context, final_result)
+        raise
+    final_feat_album_tag = ''
+
+    # check if album title has feat. artists in it, so that the folder won't have them
+    if 'feat.' in final_result['album_title']:
+        feat_album_tag = final_result['album_title'].replace(')', '(')
+        feat_album_tag = feat_album_tag.split('(')
+        log.debug("FINAL_FEAT_ALBUM_TAG_BEFORE_REPLACE: %s", feat_album_tag)
+        feat_album_tag_first = feat_album_tag[0]  # this removes the last blank space
+        final_feat_album_tag = str(feat_album_tag_first[0:-1] + feat_album_tag.pop())
+        log.debug("FINAL FEAT. ALBUM TAG: %s", final_feat_album_tag)
+
+    # get the number of the track on the album, an exact title is looked up directly before scanning for partial ones
+    title_upper = title_for_check.upper()
+    if title_upper in album['track_numbers']:
+        final_result['track_number'] = album['track_numbers'][title_upper]
+    else:
+        for n, track_title in enumerate(album['track_titles']):
+            if title_upper in track_title:  # if it finds the song, use the track number
+                final_result['track_number'] = n + 1
+                break
+    if 'track_number' in final_result:
+        log.debug("FINAL: %s", album['track_titles'][final_result['track_number'] - 1])
+    final_result['total_tracks'] = album['track_count']  # add total track count to the object
+
+    # check if song is a Single
+    if final_result['title'] == final_result['album_title'] and final_result['total_tracks'] == 1:
+        final_result['album_title'] += ' - Single'  # if title and album are the same and the album only has 1 song
+        if final_feat_album_tag:
+            final_feat_album_tag += ' - Single'
+
+    return (album['track_count'], album['album_genres'], album['release_date'], album['various_artists'],
+            album['genres'], album['genres_for_tag'], final_feat_album_tag, final_result)
+
+
+def album_cover(context, final_result):
+    # the cover art is downloaded once per album and kept in memory for the other songs from it
+    album_cover_url = ''
+    for size, cover_key in COVER_SIZES:
+        if final_result[cover_key]:
+            album_cover_url = final_result[cover_key]  # the biggest one available is used, 1000x1000 if there is one
+            if context.cover_max_size and size >= context.cover_max_size:  # unless a smaller one is enough for the downscaled cover
+                break
+    if not album_cover_url:
+        return b''
+
+    return context.albums.get(final_result['album_id'], 'cover',
+                              lambda: cover_image_fetcher(context, album_cover_url))
+
+
+def cover_cache_key(context, album_cover_url):
+    # covers are stored by the hash of their url (and the downscale settings, since those change the bytes)
+    key = f"{album_cover_url} {context.cover_max_size} {context.cover_quality}".encode()
+
+    return hashlib.sha1(key).hexdigest()
+
+
+def cover_image_fetcher(context, album_cover_url):
+    if context.cover_cache is not None:
+        cover_data = context.cover_cache.get(cover_cache_key(context, album_cover_url))
+        if cover_data is not None:
+            context.metrics.count('cover_cache_hits')
+            return cover_data
+    if context.response_cache is not None and context.response_cache.cache_only:
+        print(f"Cover art ({album_cover_url}) isn't cached and the cache-only mode is on, so it won't be downloaded.")
+        return b''
+
+    data_image = http_get(context, album_cover_url, stream=True)
+    if data_image is None or data_image.status_code != 200:
+        if data_image is not None:
+            data_image.close()  # gives its connection back to the pool
+        print(f"Cover art ({album_cover_url}) couldn't be downloaded.")
+        return b''
+
+    # read the cover into memory in chunks, giving up as soon as it goes over the size limit
+    cover_data = bytearray()
+    try:
+        with data_image:
+            for chunk in data_image.iter_content(64 * 1024):
+                cover_data += chunk
+                context.metrics.count('bytes_downloaded', len(chunk))
+                if len(cover_data) > COVER_MAX_BYTES:
+                    print(f"Cover art ({album_cover_url}) is bigger than {COVER_MAX_BYTES} bytes, it won't be used.")
+                    return b''
+    except requests.RequestException as err:
+        print(f"Cover art ({album_cover_url}) couldn't be downloaded: {err}")
+        return b''
+
+    cover_data = resize_cover(context, bytes(cover_data))
+
+    if context.cover_cache is not None:
+        context.cover_cache.put(cover_cache_key(context, album_cover_url), cover_data)
+
+    return cover_data
+
+
+@lru_cache(maxsize=None)
+def pillow_image():
+    # Pillow is optional, it's only needed (and only imported) to downscale the cover art
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    return Image
+
+
+def resize_cover(context, cover_data):
+    # shrinks the cover so that embedding it doesn't add a megabyte to every song
+    cover_max_size = context.cover_max_size
+    if not cover_max_size or pillow_image() is None:
+        return cover_data
+    try:
+        image = pillow_image().open(io.BytesIO(cover_data))
+        if max(image.size) <= cover_max_size:
+            return cover_data
+        image.thumbnail((cover_max_size, cover_max_size))
+        resized_cover = io.BytesIO()
+        image.convert('RGB').save(resized_cover, format='JPEG', quality=context.cover_quality, optimize=True)
+    except OSError as err:  # a cover Pillow can't read is embedded as it is
+        print(f"Cover art couldn't be downscaled: {err}")
+        return cover_data
+
+    return resized_cover.getvalue()
+
+
+def print_final_data(final_result, various_artists, genres, genres_for_tag, release_date):
+    if not log.isEnabledFor(logging.DEBUG):  # only shown when debugging
+        return
+    log.debug("ALBUM_ID: %s", final_result['album_id'])
+    log.debug("TRACK_ID: %s", final_result['id'])
+    log.debug("TRACK: %s", final_result['title'])
+    log.debug("ARTIST: %s", final_result['artist'])
+    log.debug("ALBUM: %s", final_result['album_title'])
+    if not various_artists:
+        log.debug("ALBUM ARTIST: %s", final_result['artist'])
+    else:
+        log.debug("ALBUM ARTIST: Various Artists")
+    log.debug("TRACK NUMBER: %s", final_result['track_number'])
+    log.debug("TRACKS: %s", final_result['total_tracks'])
+    log.debug("GENRES: %s", genres)
+    log.debug("GENRES FOR TAG: %s", genres_for_tag)
+    log.debug("COVER_URL_XL: %s", final_result['cover_url_xl'])
+    log.debug("RELEASE DATE: %s", release_date)
+    log.debug("BPM: %s", final_result['bpm'])
+    log.debug("DISC_NUMBER: 1/1")
+
+
+def prepare_tags(record, final_result, final_feat_album_tag, various_artists, release_date, genres_for_tag):
+    # the tag values and the "NN Title" filename the song is saved under
+    if final_result['title_contributors']:  # if there are artists that need to be added to the title with feat.
+        title = final_result['title_contributors']
+    else:  # if not use the regular title
+        title = final_result['title']
+    if final_feat_album_tag:  # if there's an album tag with multiple artists
+        album = final_feat_album_tag
+    else:
+        album = final_result['album_title']
+    if not various_artists:
+        album_artist = final_result['artist']  # album artist without various artists
+    else:
+        album_artist = 'Various Artists'  # album artist with various artists
+    tag_values = {'title': title, 'album': album, 'artist': final_result['artist'], 'album_artist': album_artist,
+                  'track_number': final_result['track_number'], 'total_tracks': final_result['total_tracks'],
+                  'year': str(release_date), 'genre': genres_for_tag, 'bpm': final_result['bpm']}
+    if 0 < int(final_result['track_number']) < 10:
+        track_number_for_name = '0' + str(final_result['track_number'])  # prepend a 0 for the filename (6 -> 06)
+    else:
+        track_number_for_name = str(final_result['track_number'])
+
+    return tag_values, track_number_for_name + ' ' + file_name(title) + record.extension
+
+
+def move_to_free_name(source, path, new_path):
+    # another song that was given the same name is never replaced, the song is saved as "NN Title (2)" and so on
+    # instead (the sorter reports the ones that are the same audio); returns the path it was saved under
+    stem, extension = os.path.splitext(new_path)
+    number = 1
+    while True:
+        candidate = new_path if number == 1 else f'{stem} ({number}){extension}'
+        number += 1
+        # the song's own name, also when it only differs in case on a case-insensitive filesystem
+        if candidate == path or os.path.exists(candidate) and os.path.samefile(candidate, path):
+            os.replace(source, candidate)
+            return candidate
+        try:
+            # a hard link only succeeds when the name is free, even if another worker is saving under it too
+            os.link(source, candidate)
+        except FileExistsError:
+            continue
+        except OSError:  # filesystems without hard links
+            if os.path.exists(candidate):
+                continue
+            os.replace(source, candidate)
+            return candidate
+        os.remove(source)
+        return candidate
+
+
+def write_audio_file(path, new_path, extension, tag_values, cover_data, hash_contents=False, in_place=False):
+    # returns the name the song was saved under, the seconds it took, the new size and hash, and the bytes rewritten
+    # out of the bytes touched
+    start = time.perf_counter()
+    # when asked to, an MP3 the scraper tagged before, whose tag has room for the new frames, is updated where it is
+    # and only renamed
+    written = update_id3_in_place(path, tag_values, cover_data) if in_place and extension == '.mp3' else None
+    if written is not None:
+        new_path = move_to_free_name(path, path, new_path)
+        rewritten, touched = written
+    else:
+        # the tags are written to a copy next to the song, which then takes its place under the new name in one
+        # step, so a crash leaves either the untouched song or the finished one, never a half-written file
+        descriptor, temporary_path = tempfile.mkstemp(prefix='.tags-', suffix=extension, dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, 'wb') as temporary, open(path, 'rb') as source:
+                shutil.copyfileobj(source, temporary, 1024 * 1024)
+            shutil.copymode(path, temporary_path)  # mkstemp only lets the owner read the copy
+            write_tags(temporary_path, extension, tag_values, cover_data)
+            with open(temporary_path, 'rb+') as temporary:
+                os.fsync(temporary.fileno())
+            new_path = move_to_free_name(temporary_path, path, new_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        if os.path.exists(path) and not os.path.samefile(path, new_path):
+            os.remove(path)
+        rewritten = touched = os.path.getsize(new_path)  # the whole song was copied
+
+    return os.path.basename(new_path), time.perf_counter() - start, os.path.getsize(new_path), \
+        content_hash(new_path) if hash_contents else None, rewritten, touched
+
+
+ID3_PADDING = 16 * 1024  # room left after the frames when a tag is written, so later changes fit in place
+ID3_BLOCK_SIZE = 4096  # an updated tag is compared and written back in blocks this size
+ID3_OWNER = 'tags-scraper-remastered'  # owner of the private frame that marks the tags written by the scraper
+
+
+def update_id3_in_place(path, tag_values, cover_data):
+    # renders the new frames into the song's own tag, keeping its size, and writes back only the blocks that differ,
+    # from the first to the last one in a single write, so the audio after it never moves (unlike a copy, a crash
+    # during that write can leave the tag half-updated, which is why it's opt-in); returns the bytes rewritten and
+    # touched, or None when the tag wasn't written by the scraper or the frames don't fit in it
+    with open(path, 'rb+') as file:
+        tag_size = id3_header_size(file.read(10))
+        if not tag_size:
+            return None
+        file.seek(0)
+        old_tag = file.read(tag_size)
+        # any other tag (a store's, with its own art) is only ever replaced through a copy, like the other formats
+        try:
+            if not any(frame.owner == ID3_OWNER for frame in ID3(io.BytesIO(old_tag)).getall('PRIV')):
+                return None
+        except MutagenError:
+            return None
+        tags = id3_tags(tag_values, cover_data)
+        rendered = io.BytesIO(old_tag)
+        tags.save(rendered, v2_version=3, padding=lambda info: max(info.padding, 0))
+        new_tag = rendered.getvalue()
+        if len(new_tag) != tag_size:
+            return None
+
+        changed = [offset for offset in range(0, tag_size, ID3_BLOCK_SIZE)
+                   if new_tag[offset:offset + ID3_BLOCK_SIZE] != old_tag[offset:offset + ID3_BLOCK_SIZE]]
+        rewritten = 0
+        if changed:
+            end = min(changed[-1] + ID3_BLOCK_SIZE, tag_size)
+            rewritten = os.pwrite(file.fileno(), new_tag[changed[0]:end], changed[0])
+        touched = tag_size
+
+        # an ID3v1 tag at the end is kept up to date, like mutagen does when it saves
+        size = file.seek(0, os.SEEK_END)
+        if size >= tag_size + ID3V1_SIZE:
+            file.seek(size - ID3V1_SIZE)
+            old_v1 = file.read(ID3V1_SIZE)
+            if old_v1[:3] == b'TAG':
+                touched += ID3V1_SIZE
+                new_v1 = MakeID3v1(tags)
+                if new_v1 != old_v1:
+                    rewritten += os.pwrite(file.fileno(), new_v1, size - ID3V1_SIZE)
+        if rewritten:
+            os.fsync(file.fileno())
+
+    return rewritten, touched
+
+
+def edit_audio_file(context, record, tag_values, audio_file, seconds, size, file_hash, rewritten, touched):
+    # keep the record in sync with the file, so the sorter doesn't have to read it again
+    metrics = context.metrics
+    metrics.add('tag_write', seconds)
+    metrics.count('bytes_rewritten', rewritten)
+    metrics.count('bytes_touched', touched)
+    log.debug("TAG WRITE: %d of %d bytes rewritten", rewritten, touched)
+    record.filename = audio_file
+    record.title = tag_values['title']
+    record.artist = tag_values['artist']
+    record.album = tag_values['album']
+    record.albumartist = tag_values['album_artist']
+    record.year = tag_values['year']
+    record.size = size
+    if context.journal is not None:
+        record.content_hash = file_hash
+        context.journal.update(record, 'renamed')
+    if context.fingerprints is not None and record.fingerprint is not None:
+        context.fingerprints.put(record.fingerprint, record.resolved)
+    record.resolved = record.match = None  # saved already, the record only needs its tags from now on
+    print(f"Success! {tag_values['artist']} - {tag_values['title']}")
+
+
+def id3_tags(tag_values, cover_data):
+    track = str(tag_values['track_number']) + '/' + str(tag_values['total_tracks'])  # track number/total tracks
+    tags = ID3()
+    if cover_data:
+        tags.add(
+            APIC(
+                encoding=3,  # 3 is for utf-8
+                mime='image/jpeg',  # image/png or image/jpeg
+                type=3,  # 3 is for the cover art
+                desc=u'Cover',
+                data=cover_data
+            )
+        )
+    tags.add(TIT2(encoding=3, text=tag_values['title']))
+    tags.add(TALB(encoding=3, text=tag_values['album']))
+    tags.add(TPE1(encoding=3, text=tag_values['artist']))
+    tags.add(TPE2(encoding=3, text=tag_values['album_artist']))
+    tags.add(TRCK(encoding=3, text=track))
+    tags.add(TYER(encoding=3, text=tag_values['year']))  # year
+    tags.add(TCON(encoding=3, text=tag_values['genre']))  # genres
+    tags.add(TPA(encoding=3, text='1/1'))  # disc number
+    tags.add(TBPM(encoding=3, text=tag_values['bpm']))
+    tags.add(PRIV(owner=ID3_OWNER, data=b''))  # the next run may update this tag in place
+
+    return tags
+
+
+def write_tags(path, extension, tag_values, cover_data):
+    # the new tags replace the old ones in a single write, so the file isn't cleared and saved beforehand
+    if extension == '.mp3':
+        # the padding leaves room for the next run's changes, so they can be written in place
+        id3_tags(tag_values, cover_data).save(path, v2_version=3, padding=lambda info: ID3_PADDING)
+    elif extension == '.flac':
+        audio = FLAC(path)
+        audio.clear()
+        audio.clear_pictures()
+        audio.update({'title': tag_values['title'], 'album': tag_values['album'], 'artist': tag_values['artist'],
+                      'albumartist': tag_values['album_artist'], 'tracknumber': str(tag_values['track_number']),
+                      'tracktotal': str(tag_values['total_tracks']), 'date': tag_values['year'],
+                      'genre': tag_values['genre'], 'discnumber': '1', 'disctotal': '1', 'bpm': tag_values['bpm']})
+        if cover_data:
+            picture = Picture()
+            picture.type = 3  # 3 is for the cover art
+            picture.mime = 'image/jpeg'
+            picture.desc = 'Cover'
+            picture.data = cover_data
+            audio.add_picture(picture)
+        audio.save()
+    elif extension == '.m4a':
+        audio = MP4(path)
+        if audio.tags is None:
+            audio.add_tags()
+        audio.tags.clear()
+        audio.tags.update({'\xa9nam': tag_values['title'], '\xa9alb': tag_values['album'],
+                           '\xa9ART': tag_values['artist'], 'aART': tag_values['album_artist'],
+                           'trkn': [(int(tag_values['track_number']), int(tag_values['total_tracks']))],
+                           '\xa9day': tag_values['year'], '\xa9gen': tag_values['genre'], 'disk': [(1, 1)]})
+        if tag_values['bpm'].isdigit():  # MP4 only stores the BPM as a number
+            audio.tags['tmpo'] = [int(tag_values['bpm'])]
+        if cover_data:
+            audio.tags['covr'] = [MP4Cover(cover_data, imageformat=MP4Cover.FORMAT_JPEG)]
+        audio.save()
+
+
+FICLONE = 0x40049409  # Linux ioctl that makes the destination share the source's data blocks (btrfs, xfs)
+
+
+FOLDER_LOCK_SECONDS = 30  # a lock that nobody refreshed for this long was left behind by a worker that died
+
+
+def read_lock(lock_path):
+    # the holder's token and the lock's inode and modification time, None once it's gone; the time is only compared
+    # with itself, since the clocks of the machines sharing the library can disagree
+    try:
+        with open(lock_path, 'rb') as file:
+            status = os.fstat(file.fileno())
+            return file.read(), status.st_ino, status.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def take_over_lock(lock_path, stale_token):
+    # the stale lock is moved aside in one step, so only one of the waiters gets it; if another waiter had already
+    # replaced it with its own lock, that lock is put back
+    aside = f'{lock_path}.{os.urandom(8).hex()}'
+    try:
+        os.rename(lock_path, aside)
+    except FileNotFoundError:
+        return
+    try:
+        if read_lock(aside)[0] != stale_token:
+            os.link(aside, lock_path)
+    except FileExistsError:  # a third worker locked it in the meantime, the one moved aside finds out it lost it
+        pass
+    finally:
+        os.remove(aside)
+
+
+def refresh_lock(lock_path, token, done):
+    # the holder keeps its lock fresh for as long as it needs it, so the waiters never take it over
+    while not done.wait(FOLDER_LOCK_SECONDS / 3):
+        state = read_lock(lock_path)
+        if state is None or state[0] != token:
+            print(f"({lock_path}) was taken over by another worker.")
+            return
+        os.utime(lock_path)
+
+
+@contextmanager
+def folder_lock(parent, name):
+    # one worker at a time, on any machine sharing the library, creates a folder (or saves a file) with this name in
+    # any case (O_EXCL creates the lock file atomically on NFS too)
+    lock_path = parent + '/.lock-' + hashlib.blake2b(name.casefold().encode(), digest_size=8).hexdigest()
+    token = os.urandom(16).hex().encode()  # tells this holder's lock apart from the one it replaced
+    seen = seen_since = None
+    while True:
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # a lock is only stale once it stayed the same for a while by this worker's own clock
+            state = read_lock(lock_path)
+            if state != seen:
+                seen, seen_since = state, time.monotonic()
+            elif state is not None and time.monotonic() - seen_since > FOLDER_LOCK_SECONDS:
+                take_over_lock(lock_path, state[0])
+                seen = None
+            time.sleep(0.05)
+            continue
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(token)
+        break
+    done = threading.Event()
+    refresher = threading.Thread(target=refresh_lock, args=(lock_path, token, done), daemon=True)
+    refresher.start()
+    try:
+        yield
+    finally:
+        done.set()
+        refresher.join()
+        # a lock that was taken over belongs to its new holder
+        state = read_lock(lock_path)
+        if state is not None and state[0] == token:
+            os.remove(lock_path)
+
+
+def shared_folder(parent, name):
+    # the folder's name as it is on disk, created unless a folder that only differs in case is already there,
+    # even if another worker made it a moment ago
+    key = name.casefold()
+    with folder_lock(parent, name):
+        with os.scandir(parent) as entries:
+            for entry in entries:
+                if entry.is_dir() and entry.name.casefold() == key:
+                    return entry.name
+        try:
+            os.mkdir(parent + '/' + name)
+        except FileExistsError:  # made by someone who didn't take the lock, it's used as it is
+            pass
+
+    return name
+
+
+class LibraryIndex:
+    # case-folded index of the Songs/<artist>/<album> folders, read once and updated as new folders are created
+    def __init__(self, artists_directory):
+        self.artists_directory = artists_directory
+        self.artists = {}  # case-folded artist name -> [folder name, album index or None until it's first needed]
+        with os.scandir(artists_directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    self.artists[entry.name.casefold()] = [entry.name, None]
+
+    def album_directory(self, artist, album):
+        # returns the album folder, reusing folders that only differ in case and creating the missing ones
+        artist_key = artist.casefold()
+        if artist_key not in self.artists:
+            # another worker may have made it since the index was read, its albums are listed then
+            self.artists[artist_key] = [shared_folder(self.artists_directory, artist), None]
+        artist_folder, albums = self.artists[artist_key]
+        artist_directory = self.artists_directory + '/' + artist_folder
+        if albums is None:  # each artist folder is only listed the first time one of its songs is sorted
+            albums = self.artists[artist_key][1] = {}
+            with os.scandir(artist_directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        albums[entry.name.casefold()] = entry.name
+        album_key = album.casefold()
+        if album_key not in albums:
+            albums[album_key] = shared_folder(artist_directory, album)  # creates the album folder
+
+        return artist_directory + '/' + albums[album_key]
+
+
+def file_digest(path):
+    with open(path, 'rb') as file:
+        digest = hashlib.blake2b()
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def same_file_contents(source, destination, source_size):
+    # the size is compared first so that the files are only hashed when they could be the same
+    try:
+        if os.stat(destination).st_size != source_size:
+            return False
+    except FileNotFoundError:
+        return False
+
+    return file_digest(source) == file_digest(destination)
+
+
+def place_song(source, destination, mode):
+    # puts the song in its album folder, the link modes fall back to a copy when the filesystem can't do them
+    if os.path.exists(destination) and mode in ('hardlink', 'reflink'):
+        os.remove(destination)  # an outdated version of the song is replaced
+    if mode == 'move':
+        shutil.move(source, destination)
+        return
+    try:
+        if mode == 'hardlink':
+            os.link(source, destination)
+            return
+        if mode == 'reflink' and fcntl is not None:
+            with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+                fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            return
+    except OSError as err:
+        print(f"Couldn't {mode} ({source}), copying it instead: {err}")
+    shutil.copy(source, destination)
+
+
+def song_sorter(context, records=(), mode='copy', recursive=False, extensions=AUDIO_EXTENSIONS, directory=None,
+                duplicates='report', songs=None):
+    # set directories for songs to sort and where to put them
+    songs_directory = directory or os.getcwd()
+    artists_directory = songs_directory + '/' + 'Songs'
+
+    # the songs that were just edited already have their tags in memory, only the others need to be read
+    known_records = {record.path: record for record in records}
+
+    # if Songs folder doesn't exist, create it
+    os.makedirs(artists_directory, exist_ok=True)
+
+    # the artist and album folders are only read once for the whole sort
+    library = LibraryIndex(artists_directory)
+    metrics, journal, fingerprints = context.metrics, context.journal, context.fingerprints
+
+    # songs sorted and total_songs counters
+    songs_sorted = 0
+    total_songs = 0
+
+    # every song in the directory unless it's given just some of them, as (directory, file) pairs
+    if songs is None:
+        songs = discover_audio_files(songs_directory, recursive, extensions, skip={artists_directory})
+    for file_directory, file in songs:
+        source = file_directory + '/' + file
+        total_songs += 1
+        # if it runs into an error, I just want to know what caused it, so this Exception doesn't require specificity
+        try:
+            tags = known_records.get(source) or scan_audio_file(file_directory, file)
+            if tags.album is not None and tags.albumartist is not None:  # if the song read has valid tags
+                album = file_name(tags.album) + " " + "(" + tags.year[0:4] + ")"
+                current_directory = library.album_directory(file_name(tags.albumartist), album)
+                destination = current_directory + '/' + file
+                # only sorts the song if it does not yet exist
+                if same_file_contents(source, destination, tags.size):
+                    print(f"Song ({file}) already exists in target directory {current_directory}.")
+                    continue
+                # the same audio under another name or in another folder is reported, or left out when skipped
+                if fingerprints is not None:
+                    fingerprint = fingerprints.fingerprint(tags)
+                    original = fingerprints.sorted_path(fingerprint)  # from this run or an earlier one
+                    if original is not None and original != destination and os.path.exists(original):
+                        metrics.count('duplicates')
+                        print(f"Song ({file}) has the same audio as ({original}).")
+                        if duplicates == 'skip':
+                            continue
+                with metrics.stage('sort'):
+                    place_song(source, destination, mode)
+                songs_sorted += 1
+                if fingerprints is not None:
+                    fingerprints.sorted(fingerprint, destination)
+                if journal is not None:
+                    if tags.journal_id is None:  # songs edited by an earlier run keep their journal entry
+                        journal.resume(tags)
+                    journal.update(tags, 'sorted')
+            else:
+                print(f"Song ({file}) didn't have valid meta-tags.")
+                continue
+        except Exception as err:
+            print(f"({file}) {err}")
+
+    print(f'Song sorter finished, {SORT_MODES[mode]} {songs_sorted} out of {total_songs} files.') if total_songs != 1 \
+        else print(f'Song sorter finished, {SORT_MODES[mode]} {songs_sorted} out of {total_songs} file.')
+
+
+def normalise_title(text):
+    # compares titles without accents, case, punctuation or featured artists
+    text = fold_accents(text).casefold()
+    for feat in ('(feat.', '[feat.', ' feat.', '(with ', ' ft. '):
+        if feat in text:
+            text = text.split(feat)[0]
+
+    return ' '.join(WORDS.findall(text))
+
+
+def guess_album(record):
+    # the album artist and album from the song's tags, or from an "Artist - Album" folder name
+    artist = record.albumartist or record.artist
+    album = record.album
+    if not (artist and album):
+        folder = os.path.basename(record.directory)
+        if ' - ' not in folder:
+            return None
+        artist, album = [part.strip() for part in folder.split(' - ', 1)]
+
+    return artist, album
+
+
+def guess_title(record):
+    # the title tag, or the title part of the "Artist - Title" filename
+    if record.title:
+        return record.title
+    name = os.path.splitext(record.search_name)[0]
+
+    return name.split(' - ', 1)[1] if ' - ' in name else name
+
+
+def pick_album(data, artist, album):
+    # the album whose artist and title match the local ones exactly (once normalised), or None
+    artist_key = normalise_title(artist)
+    album_key = normalise_title(album)
+    if not (artist_key and album_key):  # nothing left to compare, any album would match
+        return None
+    for result in data or []:
+        if normalise_title(result['artist']['name']) == artist_key and normalise_title(result['title']) == album_key:
+            return result
+
+    return None
+
+
+def match_album_group(context, artist, album, records):
+    # one album search and one album request for the whole group, the songs that don't match are returned
+    with context.metrics.stage('search'):
+        result = pick_album(album_search_request(context, artist, album).get('data'), artist, album)
+    if result is None:
+        return records
+    with context.metrics.stage('album'):
+        album_data = album_request(context, {'album_id': result['id']})
+    if not album_data.get('tracks'):
+        return records
+
+    # index the album's tracks by their normalised title, so each song is matched with a single lookup
+    tracks = {}
+    for track in album_data['tracks']['data']:
+        tracks.setdefault(normalise_title(track['title']), track)
+    tracks.pop('', None)  # a title with nothing to compare never matches
+    stragglers = []
+    for record in records:
+        track = tracks.get(normalise_title(guess_title(record)))
+        if track is None:
+            stragglers.append(record)
+            continue
+        record.match = TrackResult(id=track['id'], artist=track['artist']['name'], title=track['title'],
+                                   album_title=album_data['title'], cover_url_medium=album_data.get('cover_medium'),
+                                   cover_url_big=album_data.get('cover_big'), cover_url_xl=album_data.get('cover_xl'),
+                                   album_id=album_data['id'])
+    context.metrics.count('album_first_matches', len(records) - len(stragglers))
+
+    return stragglers
+
+
+def match_albums(context, music_files, workers=1):
+    # groups the songs by album and resolves each album once, the rest fall back to the search per song
+    groups = defaultdict(list)
+    records = []
+    for record in music_files:
+        records.append(record)
+        guess = guess_album(record) if record.resolved is None else None
+        key = (normalise_title(guess[0]), normalise_title(guess[1])) if guess is not None else ('', '')
+        if all(key):  # the songs whose artist or album can't be compared are searched one by one
+            groups[key].append((guess, record))
+
+    stragglers = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(match_album_group, context, group[0][0][0], group[0][0][1],
+                                   [record for _, record in group]) for group in groups.values()]
+        for future in as_completed(futures):
+            try:
+                stragglers += len(future.result())
+            except Exception as err:  # the album's songs are simply searched one by one
+                print(f"Album lookup failed: {err}")
+    context.metrics.count('album_first_stragglers', stragglers)
+
+    return records
+
+
+def resolve_audio_file(context, record, automated, avoid_singles):
+    # finds the song on Deezer and returns everything needed to tag it, or None if it wasn't found
+    metrics, catalogue = context.metrics, context.catalogue
+    # sanitise user input
+    with metrics.stage('sanitise'):
+        artist_for_url, title_for_url, title_for_check, audio, multiple_artists \
+            = sanitise_user_input(record.search_name)
+
+    if record.match is not None:  # already matched against its album by the album-first mode
+        final_result = record.match.copy()
+        title_for_check = final_result['title']  # so the track number is found by its exact title
+    else:
+        # search for song
+        with metrics.stage('search'):
+            # the artists in the local catalogue are found there, the others are searched for on Deezer
+            results = get_results(catalogue.search(title_for_check, multiple_artists), title_for_check,
+                                  multiple_artists) if catalogue is not None else []
+            if results:
+                metrics.count('catalogue_hits')
+            else:
+                results = search_song(context, artist_for_url, title_for_url, title_for_check, audio,
+                                      multiple_artists)
+
+        with metrics.stage('pick'):
+            if not results:
+                print_search_error(audio[0], title_for_check)
+                return None
+
+            # print the results and pick one, either via automation or user choice
+            final_result = print_results_and_pick_one(context, results, automated, avoid_singles, record.search_name,
+                                                      needs_contributors(audio, title_for_check))
+
+    with metrics.stage('track'):
+        # requests the track data to check the artists (contributors in Deezer's API)
+        parse_json_track = context.track_details.get(final_result, needs_contributors(audio, title_for_check))
+
+        # get the BPM (beats per minute)
+        final_result = track_bpm(parse_json_track, final_result)
+
+        # get all artists in the track, a track that couldn't be loaded keeps the search result's artist
+        final_result = get_artists(parse_json_track.get('contributors', []), audio, final_result)
+
+    with metrics.stage('album'):
+        # request data from the album to count the number of tracks and to see if it's from various artists or just one
+        parse_json_album = album_request(context, final_result)
+
+        # get track count, genres, release date and check for various artists
+        track_count, album_genres, release_date, various_artists, genres, genres_for_tag, final_feat_album_tag, \
+        final_result = get_album_information(context, parse_json_album, automated, title_for_check, final_result)
+
+    # show the user the final data
+    print_final_data(final_result, various_artists, genres, genres_for_tag, release_date)
+
+    return {'final_result': final_result, 'final_feat_album_tag': final_feat_album_tag,
+            'various_artists': various_artists, 'release_date': release_date, 'genres_for_tag': genres_for_tag}
+
+
+class Catalogue:
+    # local copy of whole discographies, searched with FTS5 on the normalised titles instead of asking Deezer, the
+    # file can be copied to other machines
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS albums (album_id INTEGER PRIMARY KEY, title TEXT NOT NULL, '
+                                'cover_medium TEXT, cover_big TEXT, cover_xl TEXT, data TEXT NOT NULL, '
+                                'synced REAL NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tracks (track_id INTEGER PRIMARY KEY, '
+                                'album_id INTEGER NOT NULL, title TEXT NOT NULL, artist TEXT NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tracks_album_id ON tracks (album_id)')
+        # the words of each track's title and artist, the rowid is the track id
+        self.connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS track_words USING fts5(title, artist)')
+        self.connection.commit()
+
+    def add_album(self, data):
+        # the album replaces what an earlier sync saved for it
+        tracks = data['tracks']['data']
+        with self.lock:
+            self.connection.execute('DELETE FROM track_words WHERE rowid IN '
+                                    '(SELECT track_id FROM tracks WHERE album_id = ?)', (data['id'],))
+            self.connection.execute('DELETE FROM tracks WHERE album_id = ?', (data['id'],))
+            self.connection.execute('INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (data['id'], data['title'], data.get('cover_medium'), data.get('cover_big'),
+                                     data.get('cover_xl'), json.dumps(data), time.time()))
+            for track in tracks:
+                self.connection.execute('DELETE FROM track_words WHERE rowid = ?', (track['id'],))
+                self.connection.execute('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?)',
+                                        (track['id'], data['id'], track['title'], track['artist']['name']))
+                self.connection.execute('INSERT INTO track_words (rowid, title, artist) VALUES (?, ?, ?)',
+                                        (track['id'], ' '.join(match_tokens(track['title'])),
+                                         ' '.join(match_tokens(track['artist']['name']))))
+            self.connection.commit()
+
+        return len(tracks)
+
+    def search(self, title, artists, limit=25):
+        # the tracks with the title's words in a row by one of the artists, shaped like Deezer's search results
+        title_words = ' '.join(match_tokens(title))
+        artist_words = [' '.join(match_tokens(artist)) for artist in artists if match_tokens(artist)]
+        if not title_words or not artist_words:
+            return []
+        any_artist = ' OR '.join(f'artist : "{words}"' for words in artist_words)
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT tracks.track_id, tracks.title, tracks.artist, albums.album_id, albums.title, '
+                'albums.cover_medium, albums.cover_big, albums.cover_xl FROM track_words '
+                'JOIN tracks ON tracks.track_id = track_words.rowid JOIN albums ON albums.album_id = tracks.album_id '
+                'WHERE track_words MATCH ? ORDER BY rank LIMIT ?',
+                (f'title : "{title_words}" AND ({any_artist})', limit)).fetchall()
+
+        return [{'id': row[0], 'title': row[1], 'artist': {'name': row[2]},
+                 'album': {'id': row[3], 'title': row[4], 'cover_medium': row[5], 'cover_big': row[6],
+                           'cover_xl': row[7]}} for row in rows]
+
+    def album(self, album_id):
+        with self.lock:
+            row = self.connection.execute('SELECT data FROM albums WHERE album_id = ?', (album_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def folder_artists(context, directory, recursive=False, extensions=AUDIO_EXTENSIONS):
+    # the artists the songs would be searched for, in the order they're first found
+    artists = {}
+    for record in discover_music(context, directory, recursive, extensions):
+        for artist in sanitise_user_input(record.search_name)[4]:
+            artists.setdefault(normalise_title(artist), artist)
+
+    return list(artists.values())
+
+
+def sync_catalogue(context, artists, workers=4):
+    # artist -> albums -> each album with its tracks, a few albums at a time, into the local catalogue
+    for artist in artists:
+        query = urlencode({'q': artist, 'limit': 5})
+        found = deezer_request(context, 'search', f"{DEEZER_API_URL}/search/artist?{query}").get('data') or []
+        match = next((result for result in found if normalise_title(result['name']) == normalise_title(artist)), None)
+        if match is None:
+            print(f"({artist}) isn't available yet in Deezer's database.")
+            continue
+
+        # the albums come in pages, each pointing to the next one
+        album_ids = []
+        url = f"{DEEZER_API_URL}/artist/{match['id']}/albums?limit=100"
+        while url:
+            page = deezer_request(context, 'artist', url)
+            album_ids.extend(album['id'] for album in page.get('data') or [])
+            url = page.get('next')
+
+        tracks = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for data in executor.map(lambda album_id: deezer_request(context, 'album',
+                                                                     f"{DEEZER_API_URL}/album/{album_id}"), album_ids):
+                if data.get('tracks'):
+                    tracks += context.catalogue.add_album(data)
+        context.metrics.count('catalogue_tracks', tracks)
+        print(f"{match['name']}: {len(album_ids)} albums, {tracks} tracks saved to the catalogue.")
+
+
+SORTER_RECORDS_MAX = 10000  # edited songs whose tags are handed to the sorter instead of being read again
+
+
+def process_audio_file(context, record, automated, avoid_singles, tag_writer=None):
+    # the track prefetched for the song's album match is let go once the song is done with it, even when the song
+    # was left as it was, put off or failed before its details were used
+    track_id = record.match['id'] if record.match is not None else None
+    try:
+        return tag_audio_file(context, record, automated, avoid_singles, tag_writer)
+    finally:
+        if track_id is not None:
+            context.track_details.discard(track_id)
+
+
+def tag_audio_file(context, record, automated, avoid_singles, tag_writer=None):
+    # audio that was tagged before, under any name or in any folder, reuses its tags instead of asking Deezer again
+    metrics, journal, fingerprints = context.metrics, context.journal, context.fingerprints
+    known = False
+    if record.resolved is None and fingerprints is not None:
+        record.resolved = fingerprints.get(fingerprints.fingerprint(record))
+        known = record.resolved is not None
+        if known:
+            metrics.count('fingerprint_hits')
+
+    # files that were matched in an interrupted run reuse the journal's tags instead of asking Deezer again
+    if record.resolved is None:
+        record.resolved = resolve_audio_file(context, record, automated, avoid_singles)
+        if record.resolved is None:
+            return False
+        if journal is not None:
+            journal.update(record, 'matched')
+
+    # a known song that still has its tags and name is left as it is
+    tag_values, audio_file = prepare_tags(record, **record.resolved)
+    if known and audio_file == record.filename and \
+            (record.title, record.artist, record.album, record.albumartist, record.year) == \
+            (tag_values['title'], tag_values['artist'], tag_values['album'], tag_values['album_artist'],
+             tag_values['year']):
+        print(f"Song ({record.filename}) is already tagged.")
+        metrics.count('files_unchanged')
+        if journal is not None:
+            journal.update(record, 'renamed')
+        record.resolved = record.match = None
+        return True
+
+    # get the cover art, downloaded only for the first song of each album
+    with metrics.stage('cover'):
+        cover_data = album_cover(context, record.resolved['final_result'])
+
+    # edit the audio file, or leave it to a tag writer process so this worker can go on with the next song
+    arguments = (record.path, os.path.join(record.directory, audio_file), record.extension, tag_values, cover_data,
+                 journal is not None, context.update_in_place)
+    if tag_writer is not None:
+        return tag_writer.submit(write_audio_file, *arguments), tag_values
+    edit_audio_file(context, record, tag_values, *write_audio_file(*arguments))
+
+    return True
+
+
+def tag_writer_pool(tag_writers):
+    # spawned rather than forked, the workers' threads and sockets shouldn't be copied into the writers
+    return ProcessPoolExecutor(max_workers=tag_writers, mp_context=multiprocessing.get_context('spawn')) \
+        if tag_writers else None
+
+
+def run_inline(function, *arguments):
+    # runs the function on this thread and returns its outcome as a finished future, Ctrl+C isn't caught
+    future = Future()
+    try:
+        future.set_result(function(*arguments))
+    except Exception as err:
+        future.set_exception(err)
+    return future
+
+
+def tags_scraper_remastered(context, music_files, automated, avoid_singles, workers=1, album_first=False,
+                            tag_writers=0, tag_writer=None):
+    # the watch mode passes its own tag writer pool, so it isn't started again for every drop
+    metrics, details, decisions = context.metrics, context.track_details, context.decisions
+    # counter for total files and files edited
+    files_edited = 0
+    # the sorter reuses the newest records, any older ones are read from the file again so big runs stay in memory
+    edited_records = deque(maxlen=SORTER_RECORDS_MAX)
+    total_files = 0
+    files_done = 0
+
+    # the interactive prompts need the user's full attention, and the main thread so Ctrl+C can stop them, so only
+    # the automated and headless modes run files in workers
+    interactive = not automated and decisions is None
+    if interactive:
+        workers = 1
+
+    # whole albums are matched with one album request before any song is searched on its own
+    if album_first:
+        music_files = match_albums(context, music_files, workers)
+        # every matched song's track id is known now, so their details are all requested straight away
+        details.prefetch(record.match['id'] for record in music_files if record.match is not None)
+
+    def finish(future, record, written_as=None):
+        nonlocal files_edited, files_done
+        try:
+            result = future.result()
+            if written_as is not None:  # written by a tag writer process
+                edit_audio_file(context, record, *written_as, *result)
+                result = True
+            elif isinstance(result, tuple):  # still being written by a tag writer process
+                writing[result[0]] = (record, result[1:])
+                return
+            if result:
+                # update counter only after a file is edited
+                files_edited += 1
+                edited_records.append(record)
+                metrics.count('files_edited')
+            else:
+                metrics.count('files_not_found')
+        except DecisionDeferred as question:
+            metrics.count('files_deferred')
+            print(f"({record.filename}) was put off until this is answered: {question}")
+        # one bad file shouldn't stop the whole batch, so the error is shown and the next file goes on
+        except Exception as err:
+            metrics.count('files_failed')
+            print(f"({record.filename}) failed: {err}")
+        files_done += 1
+        if context.show_progress:
+            metrics.progress(files_done, total_files)
+
+    def finish_done(futures):
+        for future in futures:
+            if future in pending:
+                finish(future, pending.pop(future))
+            else:
+                record, written_as = writing.pop(future)
+                finish(future, record, written_as)
+
+    own_tag_writer = tag_writer is None
+    if own_tag_writer:
+        tag_writer = tag_writer_pool(tag_writers)
+    pending = {}
+    writing = {}  # tag writer futures -> (record, (tag values,))
+    # every worker goes through the run's rate limiter, so the throughput is bound by Deezer's quota
+    try:
+        with nullcontext() if interactive else ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            submit = run_inline if interactive else executor.submit
+            # songs are submitted as they're discovered, with only a few waiting for a worker or a writer at any time
+            for record in music_files:
+                total_files += 1
+                pending[submit(process_audio_file, context, record, automated, avoid_singles, tag_writer)] = record
+                while len(pending) + len(writing) >= 2 * max(1, workers) + tag_writers:
+                    done, _ = wait(list(pending) + list(writing), return_when=FIRST_COMPLETED)
+                    finish_done(done)
+            while pending or writing:
+                done, _ = wait(list(pending) + list(writing), return_when=FIRST_COMPLETED)
+                finish_done(done)
+    finally:
+        if own_tag_writer and tag_writer is not None:
+            tag_writer.shutdown(wait=True, cancel_futures=True)
+    if context.show_progress:
+        metrics.progress(files_done, total_files, final=True)
+
+    if not total_files:
+        print('No songs found.')
+        return edited_records
+
+    print(f'Tags Scraper finished, edited {files_edited} out of {total_files} files.') if total_files != 1 \
+        else print(f'Tags Scraper finished, edited {files_edited} out of {total_files} file.')
+    questions = decisions.pending() if decisions is not None else 0
+    if questions:
+        print(f"{questions} question{'s are' if questions != 1 else ' is'} waiting in {decisions.path}, "
+              f"answer {'them' if questions != 1 else 'it'} and run again with --apply-decisions.")
+
+    return edited_records
+
+
+# inotify(7) flags and the header of each event, followed by the file name
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x2, 0x8, 0x80, 0x100
+IN_Q_OVERFLOW, IN_ISDIR = 0x4000, 0x40000000
+IN_NONBLOCK, IN_CLOEXEC = 0o4000, 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class FolderWatcher:
+    # the new and changed songs of the drop folders, from inotify on Linux or by listing the folders elsewhere, each
+    # handed out once it hasn't changed for a few seconds, so songs still being downloaded are left alone
+    def __init__(self, folders, recursive=False, extensions=AUDIO_EXTENSIONS, settle=WATCH_SETTLE_SECONDS,
+                 poll_interval=WATCH_POLL_SECONDS, polling=False):
+        self.folders = folders
+        self.recursive = recursive
+        self.extensions = extensions
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.skip = {folder + '/Songs' for folder in folders}
+        self.known = {}  # path -> (size, mtime) when it was last handed out or written by the scraper
+        self.changed = {}  # path -> (size, mtime, when it last changed)
+        self.folder_watches = {}  # inotify watch descriptor -> folder
+        self.libc = None
+        self.inotify = None if polling else self.start_inotify()
+        self.last_poll = time.monotonic()
+        self.poll()  # the songs that are already there
+
+    def start_inotify(self):
+        # inotify through the C library, None where it isn't available (not Linux, or too many watches)
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            descriptor = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if descriptor < 0:
+            return None
+        self.inotify = descriptor
+        for folder in self.folders:
+            if not self.add_watches(folder):
+                os.close(descriptor)
+                self.folder_watches.clear()
+                return None
+
+        return descriptor
+
+    def add_watches(self, folder):
+        # the folder and, when recursive, its subfolders
+        watch = self.libc.inotify_add_watch(self.inotify, os.fsencode(folder),
+                                            IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if watch < 0:
+            print(f"({folder}) couldn't be watched: {os.strerror(ctypes.get_errno())}")
+            return False
+        self.folder_watches[watch] = folder
+        if self.recursive:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir() and not entry.name.startswith('.') and entry.path not in self.skip:
+                        if not self.add_watches(entry.path):
+                            return False
+
+        return True
+
+    def wanted(self, path):
+        # songs only, the tag writers' hidden copies and the sorted songs aren't
+        name = os.path.basename(path)
+        return not name.startswith('.') and os.path.splitext(name)[1].lower() in self.extensions
+
+    def note(self, path):
+        # remembers when the file last changed, a file that's gone or back to how it was handed out is forgotten
+        try:
+            status = os.stat(path)
+        except OSError:
+            self.changed.pop(path, None)
+            return
+        state = (status.st_size, status.st_mtime_ns)
+        now = time.monotonic()
+        if self.known.get(path) == state:
+            self.changed.pop(path, None)
+        elif path not in self.changed:
+            # a song seen for the first time last changed when it was modified, the ones that were already there
+            # when the watch started don't have to wait
+            self.changed[path] = (*state, min(now, now - (time.time() - status.st_mtime)))
+        elif self.changed[path][:2] != state:
+            self.changed[path] = (*state, now)
+
+    def mark(self, paths):
+        # these are handled as they are now, they're only handed out again once they change
+        for path in paths:
+            try:
+                status = os.stat(path)
+            except OSError:
+                self.known.pop(path, None)
+                self.changed.pop(path, None)
+                continue
+            self.known[path] = (status.st_size, status.st_mtime_ns)
+            self.changed.pop(path, None)
+
+    def poll(self, folders=None):
+        # lists the folders and notes every song that's new or different
+        for folder in folders or self.folders:
+            for song_directory, item in discover_audio_files(folder, self.recursive, self.extensions, self.skip):
+                self.note(song_directory + '/' + item)
+        self.last_poll = time.monotonic()
+
+    def read_events(self, timeout):
+        if not select.select([self.inotify], [], [], timeout)[0]:
+            return
+        try:
+            buffer = os.read(self.inotify, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            watch, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            name = os.fsdecode(buffer[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0'))
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:  # events were lost, so the folders are listed again
+                self.poll()
+                continue
+            folder = self.folder_watches.get(watch)
+            if folder is None or not name:
+                continue
+            path = folder + '/' + name
+            if mask & IN_ISDIR:
+                # a new subfolder is watched, and whatever was moved in with it is listed
+                if self.recursive and not name.startswith('.') and path not in self.skip:
+                    self.add_watches(path)
+                    self.poll([path])
+            elif self.wanted(path):
+                self.note(path)
+
+    def wait(self, timeout=None):
+        # the paths that stopped changing, waiting for at least one of them (or until the timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            for path in list(self.changed):  # inotify doesn't see every write of every program
+                self.note(path)
+            ready = [path for path, (_, _, changed) in self.changed.items() if now - changed >= self.settle]
+            if ready:
+                for path in ready:
+                    del self.changed[path]
+                return ready
+            if deadline is not None and now >= deadline:
+                return []
+            # until the first pending song settles, the next poll or the deadline
+            delay = min([changed + self.settle - now for _, _, changed in self.changed.values()]
+                        + [self.poll_interval if self.inotify is None else self.settle])
+            if deadline is not None:
+                delay = min(delay, deadline - now)
+            if self.inotify is not None:
+                self.read_events(max(delay, 0.05))
+            else:
+                time.sleep(max(delay, 0.05))
+                if time.monotonic() - self.last_poll >= self.poll_interval:
+                    self.poll()
+
+    def close(self):
+        if self.inotify is not None:
+            os.close(self.inotify)
+            self.inotify = None
+
+
+def watch_folders(context, folders, options, extensions):
+    # the service mode: songs dropped in the folders are tagged and sorted as soon as they've been written, with the
+    # HTTP session, the caches, the track details and the albums of the earlier songs kept for the next ones
+    folders = sorted({os.path.realpath(folder) for folder in folders})  # the same folder under two names is one
+    watcher = FolderWatcher(folders, options.recursive, extensions, options.settle, options.poll_interval,
+                            options.polling)
+    # started once for the whole session, a new process pool for every drop would cost more than its requests
+    tag_writer = tag_writer_pool(options.tag_writers)
+    print(f"Watching {', '.join(folders)} with {'inotify' if watcher.inotify is not None else 'polling'}, "
+          f"Ctrl+C stops.")
+    try:
+        batch = watcher.wait(0)  # the songs that are already there go first
+        while True:
+            # the songs of each folder are tagged together and sorted in that folder
+            for folder, paths in songs_by_folder(folders, batch).items():
+                records = (read_record(context, *os.path.split(path)) for path in paths)
+                edited_records = tags_scraper_remastered(context, (record for record in records if record is not None),
+                                                         options.automated, options.avoid_singles, options.workers,
+                                                         options.album_first, options.tag_writers, tag_writer)
+                songs = [(record.directory, record.filename) for record in edited_records]
+                if options.sorting and songs:
+                    song_sorter(context, edited_records, options.sorting_mode, options.recursive, extensions, folder,
+                                options.duplicates, songs)
+                # the renamed songs and the ones that failed are only picked up again if they change
+                watcher.mark(paths + [directory + '/' + file for directory, file in songs])
+            batch = watcher.wait()
+    except KeyboardInterrupt:
+        print('Stopped watching.')
+    finally:
+        watcher.close()
+        if tag_writer is not None:
+            tag_writer.shutdown(wait=True, cancel_futures=True)
+
+
+class Context:
+    # what a run shares between its songs: the counters, the request budget, the HTTP session, the caches and the
+    # indexes; the pipeline's functions are handed it, so any number of runs can be open in the same process
+    def __init__(self, headers=None, requests_per_second=DEEZER_REQUESTS_PER_SECOND,
+                 request_burst=DEEZER_REQUEST_BURST, api_connections=API_CONNECTIONS, cdn_connections=CDN_CONNECTIONS,
+                 workers=4, fetch_bpm=True):
+        # the headers are in english because of the music genres
+        self.headers = headers or {"Accept-Language": "en-US,en;q=0.5"}
+        self.metrics = Metrics()
+        self.show_progress = False  # draws the live progress line
+        self.albums = AlbumRegistry(self.metrics)
+        self.rate_limiter = TokenBucket(requests_per_second, request_burst)
+        self.http_session = create_http_session(api_connections, cdn_connections)
+        self.cover_max_size = None  # downscale covers to fit this many pixels per side, None embeds them as they are
+        self.cover_quality = 85  # JPEG quality used when a cover is downscaled
+        self.cover_cache = None  # optional on-disk cache for covers, so the next runs don't download them
+        self.update_in_place = False  # MP3 tags written by the scraper are updated where they are instead of copied
+        self.response_cache = None  # the on-disk cache of Deezer's responses
+        self.journal = None  # how far each file got, when interrupted runs should be resumed
+        self.fingerprints = None  # songs whose audio was tagged before don't need Deezer again
+        self.catalogue = None  # the songs by the local catalogue's artists aren't searched on Deezer
+        self.decisions = None  # headless runs save their questions instead of asking them
+        self.track_details = TrackDetails(self, workers, fetch_bpm)
+        self.closed = False
+
+    def close(self):
+        # closing it again does nothing
+        if self.closed:
+            return
+        self.closed = True
+        for resource in (self.track_details, self.response_cache, self.http_session, self.journal, self.fingerprints,
+                         self.catalogue):
+            if resource is not None:
+                resource.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Tagger(Context):
+    # a run's settings with its HTTP session, caches and indexes, kept open so songs can be resolved, tagged and sorted
+    # in-process, one by one or in bulk
+    def __init__(self, directory=None, options=None, **settings):
+        # the settings are the command line options (as keywords, like fetch_bpm=False) with the same defaults
+        from .cli import parse_arguments
+        if options is None:
+            options = parse_arguments([] if directory is None else [directory])
+            # the tag writers are spawned processes, which import the caller's __main__ again, so a program only
+            # gets them when it asks for them (behind an if __name__ == '__main__': guard)
+            options.tag_writers = 0
+        unknown = set(settings).difference(vars(options))
+        if unknown:
+            raise TypeError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        vars(options).update(settings)
+
+        # the request budget and the connection limits are applied before anything is sent to Deezer
+        super().__init__(requests_per_second=options.requests_per_second, request_burst=options.request_burst,
+                         api_connections=options.api_connections, cdn_connections=options.cdn_connections,
+                         workers=options.workers, fetch_bpm=options.fetch_bpm)
+        self.options = options
+        self.directory = os.path.abspath(options.directory)
+        self.extensions = tuple(options.extensions)
+        try:
+            self.open(options)
+        except BaseException:
+            self.close()
+            raise
+
+    def open(self, options):
+        # the decisions are applied from the responses the headless run already cached, without asking Deezer again
+        if options.apply_decisions:
+            options.headless = options.cache_only = True
+
+        self.show_progress = options.progress
+        self.update_in_place = options.update_in_place
+
+        # cover art settings
+        if options.max_cover_size and pillow_image() is None:
+            print("Pillow isn't installed, so the cover art will be embedded at its original size.")
+        self.cover_max_size = options.max_cover_size
+        self.cover_quality = options.jpeg_quality
+        # a headless run keeps the covers of the versions it asks about, for --apply-decisions
+        if options.cache_covers or options.headless:
+            self.cover_cache = CoverCache(os.path.join(os.path.dirname(options.cache_path), 'covers'),
+                                          options.cache_max_bytes)
+
+        # open the response cache so every request can be served from disk when possible
+        if options.cache or options.cache_only:
+            self.response_cache = ResponseCache(options.cache_path, max_bytes=options.cache_max_bytes,
+                                                cache_only=options.cache_only)
+
+        # open the journal before the songs are read, so the ones already edited can be skipped
+        # the watched folders have a journal each, and the queue keeps track of the queued songs
+        if options.resume and options.watch is None and not options.work:
+            self.journal = Journal(self.directory)
+
+        # the fingerprints are shared by every folder, like the cache
+        if options.fingerprints:
+            self.fingerprints = FingerprintIndex(
+                options.fingerprint_path or os.path.join(os.path.dirname(options.cache_path), 'fingerprints.sqlite'),
+                options.mmap)
+
+        # the local catalogue is only used once something was prefetched into it
+        if options.prefetch is not None or os.path.exists(self.catalogue_path()):
+            self.catalogue = Catalogue(self.catalogue_path())
+
+        # the questions of a headless run are saved next to the songs unless told otherwise
+        if options.headless and not options.automated:
+            self.decisions = Decisions(options.decisions_file or os.path.join(self.directory, DECISIONS_FILE))
+
+    def catalogue_path(self):
+        return self.options.catalogue_path or os.path.join(os.path.dirname(self.options.cache_path),
+                                                           'catalogue.sqlite')
+
+    def record(self, path):
+        # the song's record, None if it can't be read or was already edited
+        return read_record(self, *os.path.split(os.path.abspath(path)))
+
+    def resolve(self, path):
+        # the song's tags from Deezer without touching the file, None if it wasn't found
+        record = self.record(path)
+        if record is None:
+            return None
+
+        return resolve_audio_file(self, record, self.options.automated, self.options.avoid_singles)
+
+    def tag(self, path):
+        # tags and renames the song, its new path or None if it wasn't found
+        record = self.record(path)
+        if record is None or not process_audio_file(self, record, self.options.automated, self.options.avoid_singles):
+            return None
+
+        return record.path
+
+    def tag_all(self, paths=None):
+        # many songs at once with the workers and tag writers, every song of the directory when no paths are given,
+        # the records of the edited songs are returned for sort()
+        if paths is None:
+            records = discover_music(self, self.directory, self.options.recursive, self.extensions)
+        else:
+            records = (record for record in map(self.record, paths) if record is not None)
+
+        return tags_scraper_remastered(self, records, self.options.automated, self.options.avoid_singles,
+                                       self.options.workers, self.options.album_first, self.options.tag_writers)
+
+    def sort(self, path=None, records=()):
+        # puts the song, or every song of the directory, in the Songs folder, the records skip reading the tags again
+        songs = None if path is None else [os.path.split(os.path.abspath(path))]
+        song_sorter(self, records, self.options.sorting_mode, self.options.recursive, self.extensions, self.directory,
+                    self.options.duplicates, songs)
+
+    def prefetch(self, artists=None):
+        # saves the artists' discographies to the local catalogue, the directory's artists when none are given
+        if self.catalogue is None:
+            self.catalogue = Catalogue(self.catalogue_path())
+        sync_catalogue(self, artists or folder_artists(self, self.directory, self.options.recursive, self.extensions),
+                       self.options.workers)
+
+    def watch(self, folders=None):
+        # tags the songs dropped in the folders (the directory by default) until it's interrupted
+        folders = sorted({os.path.realpath(folder) for folder in folders or [self.directory]})
+        # each watched folder has its own journal, in place of the directory's
+        if self.options.resume:
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = FolderJournals(folders)
+        watch_folders(self, folders, self.options, self.extensions)
+
+    def enqueue(self, queue_url):
+        # adds the directory's songs to the work queue shared by the workers
+        from .distributed import enqueue_songs, open_work_queue
+        work_queue = open_work_queue(queue_url, self.options.max_attempts)
+        try:
+            enqueue_songs(self, work_queue)
+        finally:
+            work_queue.close()
+
+    def work(self, queue_url):
+        # tags songs from the work queue until it's empty, with the request budget shared by every worker
+        from .distributed import SharedRateLimiter, open_work_queue, work_on_queue
+        work_queue = open_work_queue(queue_url, self.options.max_attempts)
+        own_rate_limiter = self.rate_limiter
+        self.rate_limiter = SharedRateLimiter(work_queue, self.options.requests_per_second, self.options.request_burst)
+        try:
+            work_on_queue(self, work_queue, self.options.lease_seconds)
+        finally:
+            # the Tagger's own budget once the queue is closed
+            self.rate_limiter = own_rate_limiter
+            work_queue.close()
+
+    def queue_status(self, queue_url):
+        from .distributed import open_work_queue, print_queue_status
+        work_queue = open_work_queue(queue_url, self.options.max_attempts)
+        try:
+            print_queue_status(work_queue)
+        finally:
+            work_queue.close()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import os
+
+# the settings the command line needs, kept apart so that --help doesn't have to import requests and mutagen
+
+# Deezer allows 50 requests every 5 seconds per IP, these defaults stay under that quota in any 5s window: at worst
+# the full burst and then 5s of refills, 5 + 8 * 5 = 45 requests, which leaves room for a retry after a 429
+DEEZER_REQUESTS_PER_SECOND = 8
+DEEZER_REQUEST_BURST = 5
+API_CONNECTIONS = 8  # connections kept open to Deezer's API
+CDN_CONNECTIONS = 8  # connections kept open to each cover art host, separate so neither starves the other
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # once the cache grows past this, the least recently used responses are evicted
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.m4a')  # the formats in core.AUDIO_FORMATS
+DECISIONS_FILE = '.tags_scraper_decisions.json'
+SORT_MODES = {'copy': 'copied', 'move': 'moved', 'hardlink': 'linked', 'reflink': 'cloned'}
+WATCH_SETTLE_SECONDS = 5.0  # a dropped song is left alone until it hasn't changed for this long
+WATCH_POLL_SECONDS = 2.0  # how often the folders are listed when inotify isn't available
+LEASE_SECONDS = 300  # a queued song whose worker didn't report back in this long is given to another worker
+MAX_ATTEMPTS = 3  # leases a queued song gets before it's marked as failed
+
+
+def default_cache_path():
+    # the cache is shared by every folder the scraper runs on, so it lives in the user's cache directory
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_directory, 'tags-scraper-remastered', 'responses.sqlite')
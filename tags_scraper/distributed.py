@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from . import core
+from .defaults import LEASE_SECONDS, MAX_ATTEMPTS
+
+# the distributed mode: a coordinator puts the songs of a shared directory in a work queue and workers, on this
+# machine or on others mounting the same library, lease them, tag them and report how each went
+
+REDIS_PREFIX = 'tags_scraper'
+QUEUE_POLL_SECONDS = 5  # how often an idle worker looks for songs given back by the workers that died
+
+
+class SQLiteWorkQueue:
+    # the queue in a SQLite file, for the workers of a single machine (SQLite's locks can't be trusted over NFS)
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # transactions are begun by hand, so a lease is taken by one process only
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS items (path TEXT PRIMARY KEY, state TEXT NOT NULL, '
+                                'worker TEXT, lease_until REAL, attempts INTEGER NOT NULL, result TEXT, '
+                                'updated REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS items_state ON items (state)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS rate (name TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                                'updated REAL NOT NULL)')
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def put(self, items):
+        # the songs that aren't in the queue yet, returns how many were added
+        with self.transaction() as connection:
+            added = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO items (path, state, attempts, updated) "
+                                   "VALUES (?, 'queued', 0, ?)", ((item, time.time()) for item in items))
+            return connection.total_changes - added
+
+    def lease(self, worker, seconds=LEASE_SECONDS):
+        # the next song for the worker, a song whose lease ran out goes back to the queue until it ran out of attempts
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute("UPDATE items SET state = 'failed', result = ?, updated = ? WHERE state = 'leased' "
+                               "AND lease_until < ? AND attempts >= ?",
+                               (json.dumps({'error': 'lease expired'}), now, now, self.max_attempts))
+            row = connection.execute("SELECT path FROM items WHERE state = 'queued' OR (state = 'leased' AND "
+                                     "lease_until < ?) ORDER BY updated LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE items SET state = 'leased', worker = ?, lease_until = ?, "
+                               "attempts = attempts + 1, updated = ? WHERE path = ?",
+                               (worker, now + seconds, now, row[0]))
+
+        return row[0]
+
+    def complete(self, item, worker, result):
+        # False when the lease ran out and the song went to another worker
+        with self.transaction() as connection:
+            changed = connection.execute("UPDATE items SET state = 'done', result = ?, updated = ? WHERE path = ? "
+                                         "AND state = 'leased' AND worker = ?",
+                                         (json.dumps(result), time.time(), item, worker)).rowcount
+
+        return changed == 1
+
+    def fail(self, item, worker, error):
+        # the song is tried again by the next worker until it ran out of attempts
+        with self.transaction() as connection:
+            changed = connection.execute("UPDATE items SET state = CASE WHEN attempts < ? THEN 'queued' ELSE "
+                                         "'failed' END, result = ?, updated = ? WHERE path = ? AND "
+                                         "state = 'leased' AND worker = ?",
+                                         (self.max_attempts, json.dumps({'error': error}), time.time(), item,
+                                          worker)).rowcount
+
+        return changed == 1
+
+    def status(self):
+        with self.lock:
+            counts = dict(self.connection.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in ('queued', 'leased', 'done', 'failed')}
+
+    def take_token(self, rate, capacity):
+        # a token bucket every worker of the machine draws from, returns 0 or the seconds to wait for a token
+        with self.transaction() as connection:
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated FROM rate WHERE name = 'deezer'").fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute("INSERT OR REPLACE INTO rate VALUES ('deezer', ?, ?)", (tokens, now))
+
+        return wait
+
+    def pause(self, seconds, rate):
+        # every worker waits, Deezer said the quota was exceeded
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO rate VALUES ('deezer', ?, ?)", (-seconds * rate, time.time()))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    # just enough of the Redis protocol (RESP) for the work queue, so no client library is needed
+    def __init__(self, host, port, database=0):
+        self.lock = threading.RLock()  # held across a whole WATCH ... EXEC, the watched keys belong to the connection
+        self.socket = socket.create_connection((host, port), timeout=30)
+        self.reader = self.socket.makefile('rb')
+        if database:
+            self.command('SELECT', database)
+
+    def command(self, *arguments):
+        encoded = [str(argument).encode() for argument in arguments]
+        request = b'*%d\r\n' % len(encoded) + b''.join(b'$%d\r\n%s\r\n' % (len(argument), argument)
+                                                      for argument in encoded)
+        with self.lock:
+            self.socket.sendall(request)
+            return self.reply()
+
+    def execute(self, commands):
+        # the commands run as one (MULTI/EXEC), None when a watched key changed in the meantime and nothing ran
+        with self.lock:
+            self.command('MULTI')
+            for command in commands:
+                self.command(*command)
+            return self.command('EXEC')
+
+    def reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise RedisError('connection closed')
+        kind, value = line[:1], line[1:-2]
+        if kind == b'+':
+            return value.decode()
+        if kind == b'-':
+            raise RedisError(value.decode())
+        if kind == b':':
+            return int(value)
+        if kind == b'$':
+            if int(value) < 0:
+                return None
+            data = self.reader.read(int(value) + 2)[:-2]
+            return data.decode()
+        if kind == b'*':
+            return None if int(value) < 0 else [self.reply() for _ in range(int(value))]
+        raise RedisError(f'unexpected reply {line!r}')
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+
+class RedisWorkQueue:
+    # the queue in a Redis server (or the stand-in in benchmarks/redis_stub.py), for workers on several machines;
+    # the songs wait in a list, the leased ones in a sorted set by when their lease runs out
+    def __init__(self, url, max_attempts=MAX_ATTEMPTS):
+        parsed = urlparse(url)
+        self.max_attempts = max_attempts
+        self.redis = RedisConnection(parsed.hostname or '127.0.0.1', parsed.port or 6379,
+                                     int(parsed.path.strip('/') or 0))
+
+    def key(self, name):
+        return f'{REDIS_PREFIX}:{name}'
+
+    def put(self, items):
+        # each song is only queued once, it's marked as known in the same transaction that queues it
+        added = 0
+        for item in items:
+            while True:
+                with self.redis.lock:
+                    self.redis.command('WATCH', self.key('known'))
+                    if self.redis.command('SISMEMBER', self.key('known'), item):
+                        self.redis.command('UNWATCH')
+                        break
+                    if self.redis.execute([('SADD', self.key('known'), item),
+                                           ('RPUSH', self.key('queue'), item)]) is not None:
+                        added += 1
+                        break
+
+        return added
+
+    def lease(self, worker, seconds=LEASE_SECONDS):
+        self.expire_leases()
+        # the song leaves the queue in the same transaction that leases it, so a worker dying in between can't lose it;
+        # the transaction is tried again when another worker changed the queue first
+        while True:
+            with self.redis.lock:
+                self.redis.command('WATCH', self.key('queue'))
+                item = self.redis.command('LINDEX', self.key('queue'), 0)
+                if item is None:
+                    self.redis.command('UNWATCH')
+                    return None
+                if self.redis.execute([('LPOP', self.key('queue')),
+                                       ('HSET', self.key('owners'), item, worker),
+                                       ('HINCRBY', self.key('attempts'), item, 1),
+                                       ('ZADD', self.key('leases'), time.time() + seconds, item)]) is not None:
+                    return item
+
+    def expire_leases(self):
+        # the leases that ran out go back to the queue, or to the failed songs once they ran out of attempts
+        while True:
+            with self.redis.lock:
+                self.redis.command('WATCH', self.key('leases'))
+                expired = self.redis.command('ZRANGEBYSCORE', self.key('leases'), '-inf', time.time())
+                if not expired:
+                    self.redis.command('UNWATCH')
+                    return
+                commands = []
+                for item in expired:
+                    commands += [('ZREM', self.key('leases'), item), ('HDEL', self.key('owners'), item),
+                                 self.retry_or_fail(item, 'lease expired')]
+                if self.redis.execute(commands) is not None:
+                    return
+
+    def retry_or_fail(self, item, error):
+        if int(self.redis.command('HGET', self.key('attempts'), item) or 0) < self.max_attempts:
+            return 'RPUSH', self.key('queue'), item
+
+        return 'HSET', self.key('failed'), item, json.dumps({'error': error})
+
+    def release(self, item, worker, command):
+        # ends the worker's lease and runs the command it returns in the same transaction, False if the song went to
+        # another worker in the meantime
+        while True:
+            with self.redis.lock:
+                self.redis.command('WATCH', self.key('owners'), self.key('attempts'))
+                if self.redis.command('HGET', self.key('owners'), item) != worker:
+                    self.redis.command('UNWATCH')
+                    return False
+                if self.redis.execute([('HDEL', self.key('owners'), item), ('ZREM', self.key('leases'), item),
+                                       command()]) is not None:
+                    return True
+
+    def complete(self, item, worker, result):
+        return self.release(item, worker, lambda: ('HSET', self.key('results'), item, json.dumps(result)))
+
+    def fail(self, item, worker, error):
+        return self.release(item, worker, lambda: self.retry_or_fail(item, error))
+
+    def status(self):
+        return {'queued': self.redis.command('LLEN', self.key('queue')),
+                'leased': self.redis.command('ZCARD', self.key('leases')),
+                'done': self.redis.command('HLEN', self.key('results')),
+                'failed': self.redis.command('HLEN', self.key('failed'))}
+
+    def take_token(self, rate, capacity):
+        # requests are counted per second across all machines (their clocks are expected to be in sync), the burst
+        # can't be shared this way so it's left out
+        now = time.time()
+        paused = self.redis.command('GET', self.key('paused'))
+        if paused is not None and float(paused) > now:
+            return float(paused) - now
+        window = int(now)
+        sent = self.redis.command('INCR', self.key(f'rate:{window}'))
+        if sent == 1:
+            self.redis.command('EXPIRE', self.key(f'rate:{window}'), 10)
+        if sent <= max(1, int(rate)):
+            return 0
+
+        return window + 1 - now
+
+    def pause(self, seconds, rate):
+        self.redis.command('SET', self.key('paused'), time.time() + seconds, 'PX', int(seconds * 1000) + 1000)
+
+    def close(self):
+        self.redis.close()
+
+
+def open_work_queue(url, max_attempts=MAX_ATTEMPTS):
+    # redis://host:port/db for a Redis server (or the stand-in), anything else is the path of a SQLite file
+    if url.startswith('redis://'):
+        return RedisWorkQueue(url, max_attempts)
+
+    return SQLiteWorkQueue(url, max_attempts)
+
+
+class SharedRateLimiter:
+    # the TokenBucket's interface on the queue's backend, so all the workers of all the machines share one budget
+    def __init__(self, work_queue, rate, capacity):
+        self.work_queue = work_queue
+        self.rate = rate
+        self.capacity = capacity
+
+    def configure(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+    def acquire(self):
+        while True:
+            wait = self.work_queue.take_token(self.rate, self.capacity)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        self.work_queue.pause(seconds, self.rate)
+
+
+def enqueue_songs(tagger, work_queue):
+    # the coordinator: the directory's songs, relative to it so the workers can mount the library anywhere
+    songs = [os.path.relpath(song_directory + '/' + item, tagger.directory)
+             for song_directory, item in core.discover_audio_files(tagger.directory, tagger.options.recursive,
+                                                                   tagger.extensions,
+                                                                   skip={tagger.directory + '/Songs'})]
+    added = work_queue.put(songs)
+    print(f"{added} of {len(songs)} songs were added to the queue.")
+    print_queue_status(work_queue)
+
+
+def print_queue_status(work_queue):
+    status = work_queue.status()
+    print(f"Queue: {status['queued']} waiting, {status['leased']} being tagged, {status['done']} done, "
+          f"{status['failed']} failed.")
+
+
+def work_on_queue(tagger, work_queue, lease_seconds=LEASE_SECONDS):
+    # a worker: leases songs until the queue is empty, tags them, reports how each went and sorts the ones it tagged
+    options = tagger.options
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    edited_records = []
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            item = work_queue.lease(worker, lease_seconds)
+            if item is None:
+                # the songs other workers are still tagging come back to the queue if those workers die
+                if not work_queue.status()['leased']:
+                    return
+                time.sleep(min(QUEUE_POLL_SECONDS, lease_seconds))
+                continue
+            tagger.metrics.count('queue_leases')
+            try:
+                record = tagger.record(os.path.join(tagger.directory, item))
+                if record is None:
+                    result = {'state': 'skipped'}
+                elif core.process_audio_file(tagger, record, options.automated, options.avoid_singles):
+                    result = {'state': 'tagged', 'path': os.path.relpath(record.path, tagger.directory)}
+                    with lock:
+                        edited_records.append(record)
+                else:
+                    result = {'state': 'not_found'}
+            except core.DecisionDeferred as question:
+                result = {'state': 'deferred', 'question': str(question)}
+            # the song is given to another worker, or marked as failed once it ran out of attempts
+            except Exception as err:
+                print(f"({item}) failed: {err}")
+                work_queue.fail(item, worker, str(err))
+                tagger.metrics.count('files_failed')
+                continue
+            if not work_queue.complete(item, worker, result):
+                tagger.metrics.count('queue_lost_leases')
+                print(f"({item}) took longer than its lease, it may have been tagged by another worker too.")
+
+    # the interactive prompts need the user's full attention, so only the automated and headless modes run songs
+    # concurrently
+    workers = options.workers if options.automated or options.headless else 1
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for future in [executor.submit(work) for _ in range(max(1, workers))]:
+            future.result()
+
+    print(f'Worker {worker} finished, tagged {len(edited_records)} songs.')
+    # only its own songs, the other workers sort theirs
+    if options.sorting and edited_records:
+        core.song_sorter(tagger, edited_records, options.sorting_mode, options.recursive, tagger.extensions,
+                         tagger.directory, options.duplicates,
+                         [(record.directory, record.filename) for record in edited_records])
+    print_queue_status(work_queue)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# the filenames the songs come with are split into the artists and title to search for, and every url, file and
+# folder name the scraper builds is cleaned up here
+import logging
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+log = logging.getLogger('tags_scraper')
+
+# every name the scraper builds goes through these, so the same text always gives the same url, file or folder
+URL_TABLE = str.maketrans({' ': '-', '\'': None, '.': None})  # Deezer's search ignores these
+NAME_TABLE = str.maketrans({':': ' -', '/': None, '*': None, '?': None, '<': None, '>': None, '|': None})
+WORDS = re.compile(r'[^\W_]+')  # runs of letters and digits, in any script
+
+
+@lru_cache(maxsize=8192)
+def fold_ascii(text):
+    # removes umlauts, accents etc. (NFKD splits them from their letters, the ASCII encoding drops them)
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode()
+
+
+@lru_cache(maxsize=8192)
+def fold_accents(text):
+    # removes umlauts, accents etc. too but keeps the letters of other scripts, "Кукушка" mustn't become ""
+    return ''.join(character for character in unicodedata.normalize('NFKD', text)
+                   if not unicodedata.combining(character))
+
+
+def url_name(text):
+    # "Josh A & Iamjakehill" -> "josh-a-iamjakehill", for the search url
+    return fold_ascii(text.strip('- ').lower().translate(URL_TABLE).replace('&-', ''))
+
+
+def file_name(text):
+    # what's left of a title, album or artist once the characters files and folders can't have are taken out
+    return text.translate(NAME_TABLE)
+
+
+def sanitise_user_input(audio_file):
+    log.debug("AUDIO FILE: %s", audio_file)
+    audio = os.path.basename(audio_file).split(' - ', 1)  # splits the filename into 2 (artist - song)
+    log.debug("AUDIO: %s", audio)
+    artists_for_check = [audio[0].strip()]  # artist
+    if '&' in audio[0]:  # if there are more than 2 artists, split them into two and use one for validation
+        artists_for_check = artists_for_check[0].split('&')
+    artists_for_check = [artist.strip() for artist in artists_for_check]
+    log.debug("ARTISTS FOR CHECK: %s", artists_for_check)
+    artist_for_url = url_name(audio[0])  # converts to lowercase for the url request
+    title_for_check = os.path.splitext(audio[1])[0]  # removes the extension from the filename
+    log.debug("TITLE FOR CHECK: %s", title_for_check.upper())
+    title_for_url = url_name(title_for_check)
+    log.debug("[*] (%s-%s) trying to get data...", artist_for_url, title_for_url)
+
+    return artist_for_url, title_for_url, title_for_check, audio, artists_for_check
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+# the Deezer stand-in and the corpus generator of the benchmarks are the tests' fixtures too
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from deezer_stub import DeezerStub  # noqa: E402
+from make_corpus import make_corpus  # noqa: E402
+from tags_scraper import Tagger, core  # noqa: E402
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    # two synthetic songs and the Deezer stand-in that knows them
+    songs = str(tmp_path / 'songs')
+    stub = DeezerStub(make_corpus(songs, 2))
+    monkeypatch.setattr(core, 'DEEZER_API_URL', stub.start())
+    yield songs, stub
+    stub.stop()
+
+
+@pytest.fixture
+def open_tagger(tmp_path):
+    # automated and without the response cache unless a test asks otherwise, its files are kept in tmp_path
+    def open_tagger(directory, **settings):
+        return Tagger(str(directory), **{'automated': True, 'cache': False,
+                                         'cache_path': str(tmp_path / 'cache' / 'cache.sqlite'), **settings})
+    return open_tagger
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from tags_scraper import core
+
+
+def flac_record(filename, artist, title, album):
+    return core.AudioRecord('/music', filename, {'artist': [artist], 'title': [title], 'album': [album]}, 0)
+
+
+def album(album_id, artist, title, tracks):
+    return {'id': album_id, 'title': title, 'artist': {'name': artist}, 'cover_medium': None, 'cover_big': None,
+            'cover_xl': None,
+            'tracks': {'data': [{'id': album_id * 100 + n, 'title': track, 'artist': {'name': artist}}
+                                for n, track in enumerate(tracks, 1)]}}
+
+
+def test_normalise_title_keeps_other_scripts():
+    assert core.normalise_title('Beyoncé – Halo (feat. Someone)') == 'beyonce halo'
+    assert core.normalise_title('Звезда по имени Солнце') == 'звезда по имени солнце'
+    assert core.normalise_title('宇多田ヒカル') == '宇多田ヒカル'
+    assert core.normalise_title('(!)') == ''
+
+
+def test_non_latin_albums_match_their_own_tracks(monkeypatch):
+    albums = {'Группа крови': album(1, 'Кино', 'Группа крови', ['Группа крови', 'Закрой за мной дверь']),
+              'Звезда по имени Солнце': album(2, 'Кино', 'Звезда по имени Солнце',
+                                              ['Песня без слов', 'Звезда по имени Солнце', 'Кукушка'])}
+    monkeypatch.setattr(core, 'album_search_request', lambda context, artist, title: {'data': [albums[title]]})
+    monkeypatch.setattr(core, 'album_request', lambda context, result: albums[
+        next(title for title, data in albums.items() if data['id'] == result['album_id'])])
+    records = [flac_record('1.flac', 'Кино', 'Кукушка', 'Звезда по имени Солнце'),
+               flac_record('2.flac', 'Кино', 'Звезда по имени Солнце', 'Звезда по имени Солнце'),
+               flac_record('3.flac', 'Кино', 'Закрой за мной дверь', 'Группа крови')]
+
+    with core.Context() as context:
+        core.match_albums(context, records)
+
+    assert [(record.match['title'], record.match['id']) for record in records] == \
+        [('Кукушка', 203), ('Звезда по имени Солнце', 202), ('Закрой за мной дверь', 102)]
+
+
+def test_songs_without_comparable_album_are_left_to_the_search(monkeypatch):
+    searched = []
+    monkeypatch.setattr(core, 'album_search_request',
+                        lambda context, artist, title: searched.append((artist, title)) or {'data': []})
+    records = [flac_record('1.flac', '!!!', 'Heart of Hearts', '???'),
+               flac_record('2.flac', '...', 'Other', '???')]
+
+    with core.Context() as context:
+        core.match_albums(context, records)
+
+    assert searched == []
+    assert [record.match for record in records] == [None, None]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from mutagen.id3 import ID3
+
+from deezer_stub import DeezerStub
+from make_corpus import FRAME, make_corpus
+from tags_scraper import core, main
+
+
+def test_headless_version_question_is_applied_from_the_cache(tmp_path, monkeypatch):
+    songs = str(tmp_path / 'songs')
+    manifest = make_corpus(songs, 1)
+    # the same song released as a single too, so a headless run has to ask which version to use
+    manifest.append(dict(manifest[0], track_id=200000, album_id=9000, album='Track 00000 (Single)', year='2001'))
+    stub = DeezerStub(manifest)
+    monkeypatch.setattr(core, 'DEEZER_API_URL', stub.start())
+    arguments = [songs, '--cache-path', str(tmp_path / 'cache.sqlite'), '--no-fingerprints', '--no-resume',
+                 '--no-sorting']
+    try:
+        main(arguments + ['--headless'])
+        with open(os.path.join(songs, core.DECISIONS_FILE), encoding='utf-8') as file:
+            entries = json.load(file)
+        entry, = entries.values()
+        assert [option['album'] for option in entry['options']] == ['Album 0000', 'Track 00000 (Single)']
+        entry['choice'] = 2
+        with open(os.path.join(songs, core.DECISIONS_FILE), 'w', encoding='utf-8') as file:
+            json.dump(entries, file)
+        requests = sum(stub.stats.values())
+
+        main(arguments + ['--apply-decisions'])
+    finally:
+        stub.stop()
+
+    # nothing was requested from Deezer or its covers by the apply pass, and the picked version's tags were written
+    assert sum(stub.stats.values()) == requests
+    tagged, = [name for name in os.listdir(songs) if name.endswith('.mp3')]
+    assert str(ID3(os.path.join(songs, tagged))['TALB']) == 'Track 00000 (Single)'
+    assert ID3(os.path.join(songs, tagged)).getall('APIC')
+
+
+def test_apply_decisions_without_the_bpm_has_the_contributors_cached(tmp_path, monkeypatch, capsys):
+    songs = tmp_path / 'songs'
+    songs.mkdir()
+    (songs / 'Ann & Bob - Track.mp3').write_bytes(FRAME * 40)
+    version = {'track_id': 1, 'album_id': 10, 'artist': 'Ann & Bob', 'title': 'Track', 'album': 'Album',
+               'track_number': 1, 'year': '2000'}
+    stub = DeezerStub([version, dict(version, track_id=2, album_id=11, album='Track (Single)')])
+    monkeypatch.setattr(core, 'DEEZER_API_URL', stub.start())
+    arguments = [str(songs), '--cache-path', str(tmp_path / 'cache.sqlite'), '--no-fingerprints', '--no-resume',
+                 '--no-sorting', '--no-fetch-bpm']
+    try:
+        main(arguments + ['--headless'])
+        decisions_file = songs / core.DECISIONS_FILE
+        entries = json.loads(decisions_file.read_text(encoding='utf-8'))
+        entry, = entries.values()
+        entry['choice'] = 1
+        decisions_file.write_text(json.dumps(entries), encoding='utf-8')
+        capsys.readouterr()
+
+        main(arguments + ['--apply-decisions'])
+    finally:
+        stub.stop()
+
+    # the track is needed for the artists of a song named "A & B", so the headless run cached it too
+    assert "isn't cached" not in capsys.readouterr().out
+    tagged, = [name for name in os.listdir(songs) if name.endswith('.mp3')]
+    assert str(ID3(str(songs / tagged))['TPE1']) == 'Ann & Bob'
+
+
+def test_apply_decisions_on_a_various_artists_album_has_its_cover_cached(tmp_path, monkeypatch, capsys):
+    songs = tmp_path / 'songs'
+    songs.mkdir()
+    (songs / 'Various Artists - Track.mp3').write_bytes(FRAME * 40)
+    stub = DeezerStub([{'track_id': 1, 'album_id': 10, 'artist': 'Various Artists', 'title': 'Track',
+                        'album': 'Compilation', 'track_number': 1, 'year': '2000'}])
+    monkeypatch.setattr(core, 'DEEZER_API_URL', stub.start())
+    arguments = [str(songs), '--cache-path', str(tmp_path / 'cache.sqlite'), '--no-fingerprints', '--no-resume',
+                 '--no-sorting']
+    try:
+        main(arguments + ['--headless'])
+        decisions_file = songs / core.DECISIONS_FILE
+        entries = json.loads(decisions_file.read_text(encoding='utf-8'))
+        key, = entries
+        assert key == 'various artists 10'
+        entries[key]['choice'] = 1
+        decisions_file.write_text(json.dumps(entries), encoding='utf-8')
+        capsys.readouterr()
+
+        main(arguments + ['--apply-decisions'])
+    finally:
+        stub.stop()
+
+    # the question came up while loading the album, after the song's version was known, so its cover was cached
+    assert "isn't cached" not in capsys.readouterr().out
+    tagged, = [name for name in os.listdir(songs) if name.endswith('.mp3')]
+    assert ID3(str(songs / tagged)).getall('APIC')
+
+
+def test_the_cover_cache_keeps_to_its_size_cap(tmp_path):
+    covers = core.CoverCache(str(tmp_path / 'covers'), max_bytes=250)
+    for n in range(4):
+        covers.put(f'cover{n}', bytes(100))
+        covers.get('cover0')  # used all along, so it's kept
+
+    assert sorted(os.listdir(tmp_path / 'covers')) == ['cover0.jpg', 'cover3.jpg']
+    # a new run knows what's already there
+    assert core.CoverCache(str(tmp_path / 'covers'), max_bytes=250).total_bytes == 200
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from redis_stub import RedisStub
+from tags_scraper import core, distributed
+from tags_scraper.distributed import RedisConnection, open_work_queue
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def queue_url(request, tmp_path):
+    if request.param == 'sqlite':
+        yield str(tmp_path / 'queue.sqlite')
+        return
+    stub = RedisStub()
+    yield stub.start()
+    stub.stop()
+
+
+def test_every_song_is_leased_once_by_competing_workers(queue_url):
+    songs = [f'Artist - Song {n}.mp3' for n in range(60)]
+    coordinator = open_work_queue(queue_url)
+    assert coordinator.put(songs) == 60
+    assert coordinator.put(songs) == 0
+
+    def work(worker):
+        work_queue = open_work_queue(queue_url)
+        leased = []
+        try:
+            while True:
+                item = work_queue.lease(f'worker {worker}')
+                if item is None:
+                    return leased
+                leased.append(item)
+                assert work_queue.complete(item, f'worker {worker}', {'state': 'tagged'})
+        finally:
+            work_queue.close()
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        leased = [item for items in executor.map(work, range(6)) for item in items]
+
+    assert sorted(leased) == sorted(songs)
+    assert coordinator.status() == {'queued': 0, 'leased': 0, 'done': 60, 'failed': 0}
+    coordinator.close()
+
+
+def test_a_dead_workers_song_is_leased_again(queue_url):
+    work_queue = open_work_queue(queue_url, max_attempts=2)
+    work_queue.put(['song.mp3'])
+    assert work_queue.lease('dead', 0.1) == 'song.mp3'  # and never reported back
+    time.sleep(0.2)
+
+    assert work_queue.lease('alive') == 'song.mp3'
+    assert not work_queue.complete('song.mp3', 'dead', {})
+    assert work_queue.complete('song.mp3', 'alive', {})
+    assert work_queue.status() == {'queued': 0, 'leased': 0, 'done': 1, 'failed': 0}
+    work_queue.close()
+
+
+def test_an_unfinished_redis_transaction_leaves_the_song_queued():
+    stub = RedisStub()
+    url = stub.start()
+    try:
+        work_queue = open_work_queue(url)
+        work_queue.put(['song.mp3'])
+        # a worker that dies after taking the song off the queue but before its lease is recorded
+        connection = RedisConnection('127.0.0.1', int(url.rsplit(':', 1)[1].split('/')[0]))
+        connection.command('MULTI')
+        connection.command('LPOP', work_queue.key('queue'))
+        connection.close()
+
+        assert work_queue.lease('alive') == 'song.mp3'
+        work_queue.close()
+    finally:
+        stub.stop()
+
+
+def test_a_worker_waits_for_the_songs_of_a_worker_that_died(queue_url, library, open_tagger, monkeypatch):
+    songs, stub = library
+    monkeypatch.setattr(distributed, 'QUEUE_POLL_SECONDS', 0.1)
+    coordinator = open_work_queue(queue_url)
+    coordinator.put(sorted(name for name in os.listdir(songs) if name.endswith('.mp3')))
+    # a worker that took a song and died, its lease runs out while the other worker is busy
+    assert coordinator.lease('dead', 0.5) == 'Artist 0000 - Track 00000.mp3'
+    with open_tagger(songs, fingerprints=False, sorting=False, work=True, queue=queue_url) as tagger:
+        tagger.work(queue_url)
+
+    assert coordinator.status() == {'queued': 0, 'leased': 0, 'done': 2, 'failed': 0}
+    assert sorted(name for name in os.listdir(songs) if name.endswith('.mp3')) == \
+        ['01 Track 00000.mp3', '02 Track 00001.mp3']
+    coordinator.close()
+
+
+def test_questions_saved_by_several_workers_are_all_kept(tmp_path):
+    path = str(tmp_path / core.DECISIONS_FILE)
+    first, second = core.Decisions(path), core.Decisions(path)
+    with pytest.raises(core.DecisionDeferred):
+        first.choice('version A', 'Which version of A?', [], range(1, 3))
+    with pytest.raises(core.DecisionDeferred):
+        second.choice('version B', 'Which version of B?', [], range(1, 3))
+
+    # the user answered the first question while the workers were still running
+    answered = core.Decisions(path)
+    answered.entries['version A']['choice'] = 2
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(answered.entries, file)
+    with pytest.raises(core.DecisionDeferred):
+        first.choice('version C', 'Which version of C?', [], range(1, 3))
+
+    saved = core.Decisions(path)
+    assert sorted(saved.entries) == ['version A', 'version B', 'version C']
+    assert saved.choice('version A', 'Which version of A?', [], range(1, 3)) == 2
+
+
+def test_a_lock_left_by_a_dead_worker_is_taken_over(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, 'FOLDER_LOCK_SECONDS', 0.3)
+    with core.folder_lock(str(tmp_path), 'Daft Punk'):
+        lock_path, = [str(path) for path in tmp_path.iterdir()]
+    with open(lock_path, 'wb') as file:
+        file.write(b'dead worker')
+    # its modification time is far in the future, like a lock written by a machine whose clock is ahead
+    os.utime(lock_path, (time.time() + 3600, time.time() + 3600))
+    started = time.monotonic()
+
+    with core.folder_lock(str(tmp_path), 'daft punk'):
+        assert 0.3 < time.monotonic() - started < 5
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_lock_held_longer_than_the_timeout_is_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, 'FOLDER_LOCK_SECONDS', 0.3)
+    inside = []
+
+    def hold(worker):
+        with core.folder_lock(str(tmp_path), 'Daft Punk'):
+            inside.append(worker)
+            assert len(inside) == 1
+            time.sleep(1)
+            inside.remove(worker)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(hold, range(3)))
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+
+from mutagen.id3 import ID3, TIT2
+
+# the taggers have no journal, so only the fingerprint index knows the songs tagged before
+
+
+def mp3_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.mp3'))
+
+
+def test_a_known_song_is_tagged_without_searching_again(library, open_tagger, tmp_path):
+    songs, stub = library
+    with open_tagger(songs, resume=False) as tagger:
+        tagger.tag_all()
+    # the same song somewhere else, under another name and with its tags changed by another program
+    inbox = str(tmp_path / 'inbox')
+    os.makedirs(inbox)
+    shutil.copy(os.path.join(songs, '01 Track 00000.mp3'), os.path.join(inbox, 'unknown.mp3'))
+    tags = ID3(os.path.join(inbox, 'unknown.mp3'))
+    tags.add(TIT2(encoding=3, text='Something else'))
+    tags.save()
+    stub.stats.clear()
+
+    with open_tagger(inbox, resume=False) as tagger:
+        assert len(tagger.tag_all()) == 1
+        assert tagger.metrics.snapshot()['counters']['fingerprint_hits'] == 1
+
+    assert stub.stats['search'] == stub.stats['track'] == stub.stats['album'] == 0  # only its cover is downloaded
+    assert mp3_files(inbox) == ['01 Track 00000.mp3']
+    assert str(ID3(os.path.join(inbox, '01 Track 00000.mp3'))['TIT2']) == 'Track 00000'
+
+
+def test_a_known_song_with_its_tags_is_left_as_it_is(library, open_tagger, tmp_path):
+    songs, stub = library
+    with open_tagger(songs, resume=False) as tagger:
+        tagger.tag_all()
+    modified = {name: os.stat(os.path.join(songs, name)).st_mtime_ns for name in mp3_files(songs)}
+    stub.stats.clear()
+
+    with open_tagger(songs, resume=False) as tagger:
+        tagger.tag_all()
+        assert tagger.metrics.snapshot()['counters']['files_unchanged'] == 2
+
+    assert sum(stub.stats.values()) == 0
+    assert {name: os.stat(os.path.join(songs, name)).st_mtime_ns for name in mp3_files(songs)} == modified
+
+
+def test_a_copy_of_a_known_song_keeps_both_files_and_is_reported(library, open_tagger, tmp_path):
+    songs, stub = library
+    with open_tagger(songs, resume=False) as tagger:
+        tagger.sort(records=tagger.tag_all())
+    shutil.copy(os.path.join(songs, '01 Track 00000.mp3'), os.path.join(songs, 'Artist 0000 - Track 00000 (copy).mp3'))
+
+    with open_tagger(songs, resume=False, duplicates='skip') as tagger:
+        edited = tagger.tag_all()
+        # the copy gets the same tags, but never the name of the song that's already there
+        assert mp3_files(songs) == ['01 Track 00000 (2).mp3', '01 Track 00000.mp3', '02 Track 00001.mp3']
+        tagger.sort(records=edited)
+        assert tagger.metrics.snapshot()['counters']['duplicates'] == 1
+
+    album = os.path.join(songs, 'Songs', 'Artist 0000', 'Album 0000 (1990)')
+    assert mp3_files(album) == ['01 Track 00000.mp3', '02 Track 00001.mp3']
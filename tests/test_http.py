@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from deezer_stub import DeezerStub
+from tags_scraper import core
+
+
+def fetch_in_the_background(function, *arguments):
+    # a pool that ran out of connections blocks forever, so the test gives up on it instead of hanging
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function(*arguments)), daemon=True)
+    thread.start()
+    thread.join(10)
+    return results
+
+
+def test_covers_that_fail_give_their_connections_back(monkeypatch):
+    stub = DeezerStub([])
+    url = stub.start()
+    statuses = []
+
+    def respond(path):
+        statuses.append(503 if len(statuses) % 2 else 404)  # a missing cover, then one that's retried
+        return statuses[-1], bytes(100000), 'text/plain'
+
+    stub.respond = respond
+    monkeypatch.setattr(core, 'backoff_delay', lambda attempt, retry_after=None: 0)
+    try:
+        with core.Context(cdn_connections=2) as context:
+            covers = fetch_in_the_background(
+                lambda: [core.cover_image_fetcher(context, f"{url}/cover/{number}/500.jpg") for number in range(6)])
+    finally:
+        stub.stop()
+
+    assert covers == [[b''] * 6]
+    assert 503 in statuses
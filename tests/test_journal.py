@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+
+from tags_scraper import core
+
+
+def mp3_files(songs):
+    return sorted(name for name in os.listdir(songs) if name.endswith('.mp3'))
+
+
+def test_a_song_matched_before_an_interruption_is_not_searched_again(library, open_tagger):
+    songs, stub = library
+    first = mp3_files(songs)[0]
+    with open_tagger(songs, fingerprints=False) as tagger:
+        # the run found the song on Deezer and stopped before writing its tags
+        record = tagger.record(os.path.join(songs, first))
+        record.resolved = core.resolve_audio_file(tagger, record, True, True)
+        tagger.journal.update(record, 'matched')
+    stub.stats.clear()
+
+    with open_tagger(songs, fingerprints=False) as tagger:
+        edited = tagger.tag_all()
+
+    assert len(edited) == 2
+    assert stub.stats['search'] == 1  # only the other song
+    assert '01 Track 00000.mp3' in mp3_files(songs)
+
+
+def test_songs_renamed_by_an_earlier_run_are_skipped_under_any_name(library, open_tagger):
+    songs, stub = library
+    with open_tagger(songs, fingerprints=False) as tagger:
+        assert len(tagger.tag_all()) == 2
+    # the user renamed one of them since, its contents still identify it
+    os.rename(os.path.join(songs, '01 Track 00000.mp3'), os.path.join(songs, 'Track 00000 (renamed).mp3'))
+    stub.stats.clear()
+
+    with open_tagger(songs, fingerprints=False) as tagger:
+        assert tagger.record(os.path.join(songs, 'Track 00000 (renamed).mp3')) is None
+        assert len(tagger.tag_all()) == 0
+
+    assert sum(stub.stats.values()) == 0
+    assert mp3_files(songs) == ['02 Track 00001.mp3', 'Track 00000 (renamed).mp3']
+
+
+def test_a_copy_of_an_edited_song_is_still_tagged(library, open_tagger):
+    songs, stub = library
+    with open_tagger(songs, fingerprints=False) as tagger:
+        assert len(tagger.tag_all()) == 2
+    # the same file dropped in the folder again, next to the one that was edited
+    os.makedirs(os.path.join(songs, 'inbox'))
+    shutil.copy(os.path.join(songs, '01 Track 00000.mp3'), os.path.join(songs, 'inbox', 'Artist 0000 - Track 00000.mp3'))
+
+    with open_tagger(songs, fingerprints=False, recursive=True) as tagger:
+        assert tagger.record(os.path.join(songs, '01 Track 00000.mp3')) is None
+        assert len(tagger.tag_all()) == 1
+
+    assert mp3_files(os.path.join(songs, 'inbox')) == ['01 Track 00000.mp3']
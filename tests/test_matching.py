@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from tags_scraper import core
+
+
+def result(track_id, artist, title, album='Album'):
+    return {'id': track_id, 'title': title, 'artist': {'name': artist},
+            'album': {'id': track_id, 'title': album, 'cover_medium': None, 'cover_big': None, 'cover_xl': None}}
+
+
+def titles(results):
+    return [found['title'] for found in results]
+
+
+def test_match_tokens_keeps_other_scripts():
+    assert core.match_tokens('Beyoncé - Crazy in Love') == ('beyonce', 'crazy', 'in', 'love')
+    assert core.match_tokens('Кино – Кукушка') == ('кино', 'кукушка')
+    assert core.match_tokens('宇多田ヒカル「First Love」') == ('宇多田ヒカル', 'first', 'love')
+
+
+def test_live_is_a_whole_word():
+    data = [result(1, 'Oliver Tree', 'Oliver'), result(2, 'Oliver Tree', 'Oliver (Live)')]
+
+    assert titles(core.get_results(data, 'Oliver', ['Oliver Tree'])) == ['Oliver']
+
+
+def test_live_and_acoustic_versions_are_excluded():
+    data = [result(1, 'Khalid', 'Talk (Live)'), result(2, 'Khalid', 'Talk (Acoustic)'), result(3, 'Khalid', 'Talk')]
+
+    assert titles(core.get_results(data, 'Talk', ['Khalid'])) == ['Talk']
+
+
+def test_a_live_song_keeps_its_live_versions():
+    data = [result(1, 'Khalid', 'Talk'), result(2, 'Khalid', 'Talk (Live)')]
+
+    assert titles(core.get_results(data, 'Talk (Live)', ['Khalid'])) == ['Talk (Live)']
+
+
+def test_non_latin_names_are_matched():
+    cyrillic = [result(1, 'Кино', 'Кукушка'), result(2, 'Кино', 'Группа крови')]
+    japanese = [result(3, '宇多田ヒカル', 'First Love'), result(4, '宇多田ヒカル', 'Automatic')]
+
+    assert titles(core.get_results(cyrillic, 'Кукушка', ['Кино'])) == ['Кукушка']
+    assert titles(core.get_results(japanese, 'First Love', ['宇多田ヒカル'])) == ['First Love']
+    assert core.get_results(cyrillic, 'Кукушка', ['Ария']) == []
+
+
+def test_catalogue_finds_non_latin_tracks(tmp_path):
+    catalogue = core.Catalogue(str(tmp_path / 'catalogue.sqlite'))
+    try:
+        catalogue.add_album({'id': 1, 'title': 'Звезда по имени Солнце',
+                             'tracks': {'data': [{'id': 11, 'title': 'Кукушка', 'artist': {'name': 'Кино'}},
+                                                 {'id': 12, 'title': 'Песня без слов', 'artist': {'name': 'Кино'}}]}})
+
+        assert titles(catalogue.search('Кукушка', ['Кино'])) == ['Кукушка']
+    finally:
+        catalogue.close()
+
+
+def test_avoid_singles_always_looks_at_the_album(monkeypatch):
+    albums = {20: {'contributors': [{'name': 'Various Artists'}], 'genres': {'data': [{'name': 'Pop'}]}}}
+    requested = []
+
+    def album_request(context, final_result):
+        requested.append(final_result['album_id'])
+        return albums[final_result['album_id']]
+
+    monkeypatch.setattr(core, 'album_request', album_request)
+    single = {'id': 1, 'title': 'Talk', 'album_title': 'Talk', 'album_id': 10}
+    compilation = {'id': 2, 'title': 'Talk', 'album_title': 'Summer 2019', 'album_id': 20}
+
+    # the compilation is only recognised by its album, whether or not the run had requested it before
+    picks = [core.avoid_singles_automatically(None, 2, [single, compilation], {}) for _ in range(2)]
+
+    assert picks == [single, single]
+    assert requested == [20, 20]
+
+
+def test_greatest_hits_are_whole_words():
+    assert core.is_greatest_hits({'album_title': 'Greatest Hits Vol. 1'})
+    assert core.is_greatest_hits({'album_title': 'GREATEST   HITS'})
+    assert not core.is_greatest_hits({'album_title': 'The Greatest Hitsville'})
+
+
+def test_avoid_singles_only_leaves_out_remixes_by_their_title(monkeypatch):
+    monkeypatch.setattr(core, 'album_request', lambda context, final_result: {
+        'contributors': [{'name': 'Taylor Swift'}], 'genres': {'data': [{'name': 'Pop'}]}})
+    single = {'id': 1, 'title': 'Hits Different', 'album_title': 'Hits Different', 'album_id': 10}
+    album_version = {'id': 2, 'title': 'Hits Different', 'album_title': 'Midnights', 'album_id': 20}
+    remix = {'id': 3, 'title': 'Hits Different', 'album_title': 'Hits Different (Remixes)', 'album_id': 30}
+
+    assert core.avoid_singles_automatically(None, 2, [single, album_version], {}) == album_version
+    assert core.avoid_singles_automatically(None, 2, [single, remix], {}) == single
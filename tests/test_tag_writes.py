@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+
+from mutagen.id3 import APIC, ID3, TIT2
+
+from make_corpus import FRAME
+from tags_scraper import core
+
+TAG_VALUES = {'title': 'OTW', 'album': 'OTW', 'artist': 'Khalid', 'album_artist': 'Khalid', 'track_number': 1,
+              'total_tracks': 1, 'year': '2018', 'genre': 'R&B', 'bpm': '120'}
+
+
+def store_song(path):
+    # a tag with plenty of room, like the ones with embedded art songs come with from stores
+    with open(path, 'wb') as file:
+        file.write(FRAME * 40)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text='otw'))
+    tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=bytes(200000)))
+    tags.save(path, v2_version=3)
+
+
+def test_a_tag_from_elsewhere_is_replaced_through_a_copy(tmp_path):
+    path = str(tmp_path / 'Khalid - OTW.mp3')
+    store_song(path)
+
+    written = core.write_audio_file(path, str(tmp_path / '01 OTW.mp3'), '.mp3', TAG_VALUES, bytes(1000))
+
+    assert written[4] == written[5] == os.path.getsize(tmp_path / '01 OTW.mp3')  # the whole song was copied
+    assert not os.path.exists(path)
+    assert [name for name in os.listdir(tmp_path) if name.startswith('.tags-')] == []
+
+
+def test_the_scrapers_own_tag_is_updated_in_place(tmp_path):
+    path = str(tmp_path / 'Khalid - OTW.mp3')
+    store_song(path)
+    core.write_audio_file(path, str(tmp_path / '01 OTW.mp3'), '.mp3', TAG_VALUES, bytes(1000))
+
+    written = core.write_audio_file(str(tmp_path / '01 OTW.mp3'), str(tmp_path / '01 OTW (Remix).mp3'), '.mp3',
+                                    dict(TAG_VALUES, title='OTW (Remix)'), bytes(1000), in_place=True)
+
+    assert 0 < written[4] <= core.ID3_BLOCK_SIZE < written[5]
+    assert str(ID3(str(tmp_path / '01 OTW (Remix).mp3'))['TIT2']) == 'OTW (Remix)'
+
+
+def test_the_scrapers_own_tag_goes_through_a_copy_unless_asked_otherwise(tmp_path):
+    path = str(tmp_path / 'Khalid - OTW.mp3')
+    store_song(path)
+    core.write_audio_file(path, str(tmp_path / '01 OTW.mp3'), '.mp3', TAG_VALUES, bytes(1000))
+
+    written = core.write_audio_file(str(tmp_path / '01 OTW.mp3'), str(tmp_path / '01 OTW (Remix).mp3'), '.mp3',
+                                    dict(TAG_VALUES, title='OTW (Remix)'), bytes(1000))
+
+    assert written[4] == written[5] == os.path.getsize(tmp_path / '01 OTW (Remix).mp3')
+    assert str(ID3(str(tmp_path / '01 OTW (Remix).mp3'))['TIT2']) == 'OTW (Remix)'
+
+
+def test_a_different_song_with_the_same_name_is_never_replaced(tmp_path):
+    first, second = str(tmp_path / 'Intro.mp3'), str(tmp_path / 'Other - Intro.mp3')
+    store_song(first)
+    core.write_audio_file(first, str(tmp_path / '01 Intro.mp3'), '.mp3', TAG_VALUES, bytes(1000))
+    store_song(second)
+
+    written = core.write_audio_file(second, str(tmp_path / '01 Intro.mp3'), '.mp3', dict(TAG_VALUES, artist='Other'),
+                                    bytes(1000))
+
+    assert written[0] == '01 Intro (2).mp3'
+    assert str(ID3(str(tmp_path / '01 Intro.mp3'))['TPE1']) == 'Khalid'
+    assert str(ID3(str(tmp_path / '01 Intro (2).mp3'))['TPE1']) == 'Other'
+    # a song tagged again under its own name stays where it is
+    assert core.write_audio_file(str(tmp_path / '01 Intro.mp3'), str(tmp_path / '01 Intro.mp3'), '.mp3', TAG_VALUES,
+                                 bytes(1000))[0] == '01 Intro.mp3'
+    assert sorted(os.listdir(tmp_path)) == ['01 Intro (2).mp3', '01 Intro.mp3']
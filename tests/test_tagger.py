@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+import pytest
+
+from deezer_stub import DeezerStub
+from make_corpus import make_corpus
+from tags_scraper import core
+
+
+def test_two_taggers_can_be_open_side_by_side(tmp_path, monkeypatch, open_tagger):
+    first_songs, second_songs = tmp_path / 'first', tmp_path / 'second'
+    stub = DeezerStub(make_corpus(str(first_songs), 2) + make_corpus(str(second_songs), 1))
+    monkeypatch.setattr(core, 'DEEZER_API_URL', stub.start())
+    try:
+        with open_tagger(first_songs, fingerprints=False, cache=True) as first, \
+                open_tagger(second_songs, fingerprints=False) as second:
+            assert first.journal is not second.journal
+            assert second.response_cache is None
+            assert len(second.tag_all()) == 1
+            assert len(first.tag_all()) == 2
+            # each one counted its own songs and its journal is still open
+            assert first.metrics.snapshot()['counters']['files_edited'] == 2
+            assert second.metrics.snapshot()['counters']['files_edited'] == 1
+            assert first.record(str(first_songs / '01 Track 00000.mp3')) is None
+    finally:
+        stub.stop()
+
+    assert sorted(name for name in os.listdir(second_songs) if name.endswith('.mp3')) == ['01 Track 00000.mp3']
+
+
+def test_close_is_idempotent(tmp_path, open_tagger):
+    tagger = open_tagger(tmp_path)
+    tagger.close()
+    tagger.close()
+
+    assert tagger.closed
+
+
+def test_each_tagger_starts_with_its_own_metrics_and_albums(tmp_path, open_tagger):
+    with open_tagger(tmp_path) as tagger:
+        tagger.metrics.count('files_edited')
+        tagger.albums.get(1, 'data', lambda: {'id': 1})
+        first = tagger.metrics
+
+    with open_tagger(tmp_path) as tagger:
+        assert tagger.metrics is not first
+        assert tagger.metrics.snapshot()['counters'] == {}
+        assert not tagger.albums.entries
+        # a program's own __main__ isn't imported again by tag writer processes it didn't ask for
+        assert tagger.options.tag_writers == 0
+
+
+def test_the_interactive_mode_asks_on_the_main_thread_so_ctrl_c_stops_it(monkeypatch):
+    threads = []
+
+    def process_audio_file(context, record, automated, avoid_singles, tag_writer=None):
+        threads.append(threading.current_thread())
+        if len(threads) == 2:
+            raise KeyboardInterrupt  # Ctrl+C at the second song's prompt
+        return False
+
+    monkeypatch.setattr(core, 'process_audio_file', process_audio_file)
+    records = [core.AudioRecord('/music', f'Khalid - Song {number}.mp3', {}, 0) for number in range(3)]
+    with core.Context() as context:
+        with pytest.raises(KeyboardInterrupt):
+            core.tags_scraper_remastered(context, iter(records), False, False, workers=4)
+
+    assert threads == [threading.main_thread()] * 2
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tags_scraper import core
+
+
+def test_duplicate_songs_share_one_track_request(monkeypatch):
+    requested = []
+    started = threading.Barrier(8)
+
+    def track_request(context, final_result):
+        requested.append(final_result['id'])
+        time.sleep(0.05)
+        return {'id': final_result['id'], 'bpm': 120, 'contributors': [{'name': 'Khalid'}]}
+
+    monkeypatch.setattr(core, 'track_request', track_request)
+    details = core.TrackDetails(None, concurrency=4)
+    try:
+        def get(_):
+            started.wait()
+            return details.get({'id': 1, 'artist': 'Khalid'})
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(get, range(8)))
+    finally:
+        details.close()
+
+    assert requested == [1]
+    assert all(result['bpm'] == 120 for result in results)
+    assert details.pending == {}
+
+
+def test_featured_songs_keep_their_contributors_without_the_bpm(monkeypatch):
+    requested = []
+
+    def track_request(context, final_result):
+        requested.append(final_result['id'])
+        return {'id': final_result['id'], 'contributors': [{'name': 'Khalid'}, {'name': '6LACK'}]}
+
+    monkeypatch.setattr(core, 'track_request', track_request)
+    details = core.TrackDetails(None, fetch_bpm=False)
+    try:
+        alone = details.get({'id': 1, 'artist': 'Khalid'})
+        featured = details.get({'id': 2, 'artist': 'Khalid'}, contributors=True)
+    finally:
+        details.close()
+
+    assert alone == {'contributors': [{'name': 'Khalid'}]}
+    assert [artist['name'] for artist in featured['contributors']] == ['Khalid', '6LACK']
+    assert requested == [2]
+
+
+def test_a_prefetched_track_no_song_used_is_let_go(monkeypatch):
+    monkeypatch.setattr(core, 'track_request', lambda context, final_result: {'id': final_result['id']})
+    details = core.TrackDetails(None, concurrency=1)
+    try:
+        details.prefetch([1, 2])
+        details.discard(1)
+        with details.lock:  # a song still waiting for its track keeps it
+            details.pending[2][1] += 1
+        details.discard(2)
+        assert list(details.pending) == [2]
+    finally:
+        details.close()
+
+
+def test_a_song_that_fails_lets_its_prefetched_track_go(monkeypatch):
+    def resolve_audio_file(context, record, automated, avoid_singles):
+        raise RuntimeError('no connection')
+
+    monkeypatch.setattr(core, 'track_request', lambda context, final_result: {'id': final_result['id']})
+    monkeypatch.setattr(core, 'resolve_audio_file', resolve_audio_file)
+    with core.Context() as context:
+        record = core.AudioRecord('/music', 'Khalid - OTW.mp3', {}, 0)
+        record.match = {'id': 1}
+        context.track_details.prefetch([1])
+        with pytest.raises(RuntimeError):
+            core.process_audio_file(context, record, True, False)
+
+        assert context.track_details.pending == {}
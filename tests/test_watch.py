@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import pytest
+
+from tags_scraper import core
+
+SETTLE = 0.3
+
+
+@pytest.fixture(params=[True, False], ids=['polling', 'inotify'])
+def watcher(request, tmp_path):
+    # an old song that was already there and the watcher, with inotify where it's available
+    old_song = tmp_path / 'Old - Song.mp3'
+    old_song.write_bytes(b'old')
+    os.utime(old_song, (time.time() - 60, time.time() - 60))
+    folder_watcher = core.FolderWatcher([str(tmp_path)], settle=SETTLE, poll_interval=0.05, polling=request.param)
+    yield folder_watcher
+    folder_watcher.close()
+
+
+def write(path, data):
+    with open(path, 'ab') as file:
+        file.write(data)
+
+
+def test_a_song_is_only_handed_out_once_it_stops_changing(watcher, tmp_path):
+    old_song = str(tmp_path / 'Old - Song.mp3')
+    assert watcher.wait(0) == [old_song]  # it stopped changing long ago
+    watcher.mark([old_song])  # like the watch mode does with every song it was handed
+
+    song = str(tmp_path / 'New - Song.mp3')
+    write(song, b'first half')
+    assert watcher.wait(SETTLE / 2) == []
+    write(song, b'second half')  # still being downloaded, so it has to settle again
+    assert watcher.wait(SETTLE * 0.75) == []
+    started = time.monotonic()
+
+    assert watcher.wait(5) == [song]
+    assert time.monotonic() - started < 5
+
+
+def test_marked_songs_are_only_handed_out_again_when_they_change(watcher, tmp_path):
+    old_song = str(tmp_path / 'Old - Song.mp3')
+    assert watcher.wait(0) == [old_song]
+    # tagged and renamed by the scraper, neither name comes back
+    renamed = str(tmp_path / '01 Song.mp3')
+    os.rename(old_song, renamed)
+    watcher.mark([old_song, renamed])
+    assert watcher.wait(SETTLE * 2) == []
+
+    write(renamed, b'changed by another program')
+
+    assert watcher.wait(5) == [renamed]
+
+
+def test_hidden_copies_and_other_files_are_left_alone(watcher, tmp_path):
+    watcher.mark(watcher.wait(0))
+    write(str(tmp_path / '.tags-copy.mp3'), b'a tag writer copy')
+    write(str(tmp_path / 'cover.jpg'), b'not a song')
+
+    assert watcher.wait(SETTLE * 2) == []
+
+
+def test_a_song_in_a_folder_inside_another_goes_to_the_inner_one_once(tmp_path):
+    outer, inner = str(tmp_path), str(tmp_path / 'Drops')
+    songs = [outer + '/A - Song.mp3', inner + '/B - Song.mp3', inner + '/Album/C - Song.mp3']
+
+    assert core.songs_by_folder([outer, inner], songs) == {outer: [songs[0]], inner: songs[1:]}
+    assert core.songs_by_folder([inner], songs) == {inner: songs[1:]}